@@ -0,0 +1,154 @@
+import asyncio
+import os
+from collections import deque
+from typing import Callable, Optional
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import QueryParams
+
+from app.degraded import degraded_response
+
+
+# Per-route limits for upstream-bound routes (the threadpool is shared by every sync handler)
+_ROUTE_LIMIT = int(os.getenv("ADMISSION_ROUTE_LIMIT", "8"))
+_QUEUE_LIMIT = int(os.getenv("ADMISSION_QUEUE_LIMIT", "16"))
+_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2"))
+
+LIMITED_ROUTES = ("/items", "/items/detail", "/items/by_category", "/orders", "/orders/detail")
+
+
+class RouteLimiter:
+    """Concurrency limit with a bounded FIFO wait queue and a queueing deadline.
+
+    Lives on the event loop (no locks): requests beyond `limit` wait in the queue for
+    at most `timeout` seconds; when the queue is full they are shed immediately.
+    """
+
+    def __init__(self, limit: int, queue_limit: int, timeout: float):
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.active = 0
+        self.admitted = 0
+        self.shed = 0
+        self.shed_stale = 0
+        self.timed_out = 0
+        self._queue: deque = deque()
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit and not self._queue:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self._queue) >= self.queue_limit:
+            self.shed += 1
+            return False
+
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.append(fut)
+        try:
+            await asyncio.wait({fut}, timeout=self.timeout)
+        except BaseException:
+            # Client went away while queued: give back a slot we may have just been handed
+            if fut.done():
+                self.release()
+            else:
+                self._queue.remove(fut)
+                fut.cancel()
+            raise
+        if not fut.done():
+            self._queue.remove(fut)
+            fut.cancel()
+            self.timed_out += 1
+            self.shed += 1
+            return False
+        # Slot was handed over by release(); `active` already accounts for it
+        self.admitted += 1
+        return True
+
+    def release(self):
+        while self._queue:
+            fut = self._queue.popleft()
+            if not fut.done():
+                fut.set_result(True)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": len(self._queue),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "shed_stale": self.shed_stale,
+            "timed_out": self.timed_out,
+        }
+
+
+_LIMITERS: dict[str, RouteLimiter] = {path: RouteLimiter(_ROUTE_LIMIT, _QUEUE_LIMIT, _QUEUE_TIMEOUT_SECONDS) for path in LIMITED_ROUTES}
+
+# path -> callable(query_params) returning a cached {"ts", "body"} entry (or None) to serve
+# when shedding; providers only return entries within their last-good max age
+_STALE_PROVIDERS: dict[str, Callable] = {}
+
+
+def register_stale_provider(path: str, provider: Callable):
+    _STALE_PROVIDERS[path] = provider
+
+
+def admission_stats() -> dict:
+    return {path: limiter.stats() for path, limiter in _LIMITERS.items()}
+
+
+def _route_path(path: str) -> str:
+    # Routers are mounted both at "/" and under "/api"; both share one limiter
+    return path[4:] if path.startswith("/api/") else path
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying RouteLimiter to LIMITED_ROUTES.
+
+    Other routes (health, metrics, config...) bypass admission entirely. When a
+    limited route is saturated it answers with the cached body as degraded (X-Degraded
+    load_shed, Age) if the router registered a provider and has an entry, otherwise
+    503 with Retry-After.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limiter: Optional[RouteLimiter] = None
+        if scope["type"] == "http":
+            path = _route_path(scope["path"])
+            limiter = _LIMITERS.get(path)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limiter.acquire():
+            await self._shed(scope, path, limiter)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+    def _shed(self, scope, path: str, limiter: RouteLimiter):
+        provider = _STALE_PROVIDERS.get(path)
+        if provider is not None:
+            try:
+                stale = provider(QueryParams(scope.get("query_string", b"")))
+            except Exception:
+                stale = None
+            if stale is not None:
+                limiter.shed_stale += 1
+                response = degraded_response(stale, "load_shed")
+                response.headers["X-Load-Shed"] = "stale"
+                return response
+        return JSONResponse(
+            {"detail": {"error": "overloaded", "retry_after": 1}},
+            status_code=503,
+            headers={"Retry-After": "1", "X-Load-Shed": "rejected"},
+        )
@@ -0,0 +1,190 @@
+import threading
+import time
+from bisect import bisect_right, insort
+from collections import deque
+from typing import Optional
+
+
+METRICS = ("revenue", "order_count", "item_units")
+
+_EXCLUDED_STATUSES = {"cancelled"}
+_EVENT_LOG_SIZE = 500
+_DAY_SECONDS = 86400
+
+
+def metric_key(metric: str, item_id: Optional[int] = None) -> str:
+    return f"{metric}:{item_id}" if metric == "item_units" else metric
+
+
+def day_start(ts: float, utc_offset_hours: float) -> int:
+    """Unix time of 00:00 of the day containing `ts`, in the given UTC offset."""
+    offset = int(utc_offset_hours * 3600)
+    return int((ts + offset) // _DAY_SECONDS * _DAY_SECONDS - offset)
+
+
+class AlertEngine:
+    """Threshold alerts evaluated incrementally as orders arrive.
+
+    Running totals are kept per metric key ("revenue", "order_count",
+    "item_units:<item_id>"). Armed rules are indexed per metric key in a list sorted
+    by threshold, so an order moving a metric from `old` to `new` only touches the
+    rules with old < threshold <= new (two bisects plus the rules that fire).
+    Rules are one-shot: a fired rule leaves the index until it is re-added.
+
+    Metrics cover orders placed since `since`, so paging back through history does not
+    count toward them. With an explicit `since` the window is fixed; by default it is
+    the current day (00:00 at `utc_offset_hours`, JST by default) and rolls over at
+    midnight, clearing the metrics and re-arming fired rules. Each order's contribution
+    is remembered, so a later payload (cancellation, changed total, items from
+    /1/orders/detail) only applies the difference.
+    """
+
+    def __init__(self, since: Optional[float] = None, utc_offset_hours: float = 9):
+        self.daily = since is None
+        self.utc_offset_hours = utc_offset_hours
+        self.since = day_start(time.time(), utc_offset_hours) if since is None else int(since)
+        self.values: dict[str, int] = {}
+        self.rules: dict[int, dict] = {}
+        self.events: deque = deque(maxlen=_EVENT_LOG_SIZE)
+        self.seq = 0
+        self._index: dict[str, list] = {}  # metric key -> sorted [(threshold, rule_id)]
+        self._counted: dict[str, dict] = {}  # unique_key -> {metric key: contribution}
+        self._next_rule_id = 1
+        self._lock = threading.Lock()
+
+    def add_rule(self, metric: str, threshold: int, item_id: Optional[int] = None, label: Optional[str] = None) -> tuple[dict, list]:
+        """Register a rule; returns (rule, events). Fires at once if the metric is already past it."""
+        if metric not in METRICS:
+            raise ValueError(f"Unsupported metric: {metric}")
+        if metric == "item_units" and item_id is None:
+            raise ValueError("item_units rules need an item_id")
+        key = metric_key(metric, item_id)
+        with self._lock:
+            self._roll()
+            rule = {
+                "rule_id": self._next_rule_id,
+                "metric": metric,
+                "item_id": item_id,
+                "threshold": threshold,
+                "label": label,
+                "fired": False,
+            }
+            self._next_rule_id += 1
+            self.rules[rule["rule_id"]] = rule
+            if self.values.get(key, 0) >= threshold:
+                return rule, [self._fire(rule, self.values.get(key, 0), None)]
+            insort(self._index.setdefault(key, []), (threshold, rule["rule_id"]))
+            return rule, []
+
+    def remove_rule(self, rule_id: int) -> bool:
+        with self._lock:
+            rule = self.rules.pop(rule_id, None)
+            if rule is None:
+                return False
+            if not rule["fired"]:
+                index = self._index.get(metric_key(rule["metric"], rule["item_id"]), [])
+                pos = bisect_right(index, (rule["threshold"], rule_id)) - 1
+                if pos >= 0 and index[pos] == (rule["threshold"], rule_id):
+                    del index[pos]
+            return True
+
+    def ingest(self, order: dict) -> list:
+        """Apply one order (summary or detail form) and return the events it fired.
+
+        Orders placed before `since` are ignored. Cancelled orders and items count as
+        zero, so cancelling a counted order subtracts it. Summary payloads carry no items
+        and leave previously counted item_units untouched.
+        """
+        key = order.get("unique_key")
+        if not key:
+            return []
+        lines = order.get("order_items")
+
+        with self._lock:
+            self._roll()
+            old = self._counted.get(key)
+            if old is None and int(order.get("ordered") or 0) < self.since:
+                return []
+
+            new: dict[str, int] = {}
+            if order.get("dispatch_status") not in _EXCLUDED_STATUSES:
+                active = [l for l in lines or [] if l.get("status") not in _EXCLUDED_STATUSES]
+                total = order.get("total")
+                if total is None:
+                    total = sum(l.get("total") or 0 for l in active)
+                new["revenue"] = total or 0
+                new["order_count"] = 1
+                if isinstance(lines, list) and lines:
+                    for line in active:
+                        if line.get("item_id") is not None:
+                            k = metric_key("item_units", line["item_id"])
+                            new[k] = new.get(k, 0) + (line.get("amount") or 1)
+                elif old:
+                    new.update((k, v) for k, v in old.items() if k.startswith("item_units:"))
+            old = old or {}
+            self._counted[key] = new
+
+            events = []
+            for k in old.keys() | new.keys():
+                delta = new.get(k, 0) - old.get(k, 0)
+                if not delta:
+                    continue
+                before = self.values.get(k, 0)
+                after = self.values[k] = before + delta
+                index = self._index.get(k)
+                if not index or delta < 0:
+                    continue
+                lo = bisect_right(index, (before, float("inf")))
+                hi = bisect_right(index, (after, float("inf")))
+                if lo == hi:
+                    continue
+                for _, rule_id in index[lo:hi]:
+                    events.append(self._fire(self.rules[rule_id], after, key))
+                del index[lo:hi]
+            return events
+
+    def window(self) -> int:
+        """Start of the current counting window (unix seconds)."""
+        with self._lock:
+            self._roll()
+            return self.since
+
+    def _roll(self):
+        # Daily window: on the first call after midnight start a new day with fresh
+        # metrics, and arm every rule again. Callers hold the lock.
+        if not self.daily or time.time() < self.since + _DAY_SECONDS:
+            return
+        self.since = day_start(time.time(), self.utc_offset_hours)
+        self.values = {}
+        self._counted = {}
+        self._index = {}
+        for rule in self.rules.values():
+            rule["fired"] = False
+            insort(self._index.setdefault(metric_key(rule["metric"], rule["item_id"]), []), (rule["threshold"], rule["rule_id"]))
+
+    def _fire(self, rule: dict, value: int, order_key: Optional[str]) -> dict:
+        rule["fired"] = True
+        self.seq += 1
+        event = {
+            "seq": self.seq,
+            "ts": int(time.time()),
+            "rule_id": rule["rule_id"],
+            "metric": rule["metric"],
+            "item_id": rule["item_id"],
+            "threshold": rule["threshold"],
+            "label": rule["label"],
+            "value": value,
+            "unique_key": order_key,
+        }
+        self.events.append(event)
+        return event
+
+    def events_since(self, since: int) -> list:
+        with self._lock:
+            newer = []
+            for event in reversed(self.events):
+                if event["seq"] <= since:
+                    break
+                newer.append(event)
+        newer.reverse()
+        return newer
@@ -0,0 +1,194 @@
+import threading
+from array import array
+from typing import Optional
+
+
+# Status code reserved for summary rows replaced by per-item rows (see OrderStore.add_order)
+_SUPERSEDED = 0
+
+GROUP_KEYS = ("hour", "item", "status")
+
+# _orders values pack the order's first row index and its number of item rows
+# (0 = a single summary row): row << _LINE_BITS | lines
+_LINE_BITS = 16
+_LINE_MASK = (1 << _LINE_BITS) - 1
+
+
+class OrderStore:
+    """Compact columnar store for order history.
+
+    Each row is one order line: (ordered timestamp, amount in yen, item_id, status).
+    Columns are typed `array.array`s (8 bytes per number, 1 byte per status code)
+    instead of the nested dicts returned by BASE, so weeks of history stay small.
+    Per-hour/item/status rollups are maintained on append, so unbounded (or
+    hour-aligned) group-by queries cost O(groups); other time ranges scan the columns.
+
+    Orders seen only in summary form (`/1/orders`) are stored as a single row with
+    item_id 0. When the same order later arrives with `order_items` (`/1/orders/detail`)
+    the summary row is superseded by one row per item. Later payloads for a known order
+    update its rows in place (status, totals), re-rolling the affected aggregates.
+
+    Thread-safe: request handlers, the prefetch worker and the overlay read and write
+    the same store, so public methods hold a lock.
+    """
+
+    def __init__(self):
+        self.ts = array("q")
+        self.amount = array("q")
+        self.item_id = array("q")
+        self.status = array("B")
+        self._status_names: list[str] = ["superseded"]
+        self._status_codes: dict[str, int] = {"superseded": _SUPERSEDED}
+        self._orders: dict[str, int] = {}  # unique_key -> packed first row / item row count
+        self._rollups: dict[str, dict] = {by: {} for by in GROUP_KEYS}  # by -> key -> [total, count]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ts)
+
+    def nbytes(self) -> int:
+        """Approximate buffer size of the columns in bytes."""
+        with self._lock:
+            return sum(col.itemsize * len(col) for col in (self.ts, self.amount, self.item_id, self.status))
+
+    def _status_code(self, name: Optional[str]) -> int:
+        name = name or "unknown"
+        code = self._status_codes.get(name)
+        if code is None:
+            if len(self._status_names) >= 256:
+                raise ValueError("Too many distinct order statuses")
+            code = len(self._status_names)
+            self._status_names.append(name)
+            self._status_codes[name] = code
+        return code
+
+    def _roll(self, ts: int, amount: int, item_id: int, code: int, sign: int):
+        for by, k in (("hour", ts - ts % 3600), ("item", item_id), ("status", code)):
+            acc = self._rollups[by].get(k)
+            if acc is None:
+                acc = self._rollups[by][k] = [0, 0]
+            acc[0] += sign * amount
+            acc[1] += sign
+            if acc[1] == 0:
+                del self._rollups[by][k]
+
+    def append(self, ts: int, amount: int, item_id: int, status: Optional[str]):
+        """Append a single row."""
+        with self._lock:
+            self._append(int(ts), int(amount), int(item_id), self._status_code(status))
+
+    def _append(self, ts: int, amount: int, item_id: int, code: int):
+        self.ts.append(ts)
+        self.amount.append(amount)
+        self.item_id.append(item_id)
+        self.status.append(code)
+        self._roll(ts, amount, item_id, code, 1)
+
+    def _rewrite(self, row: int, amount: int, code: int) -> bool:
+        """Change a row's amount and status, moving it between rollup groups."""
+        if self.amount[row] == amount and self.status[row] == code:
+            return False
+        if self.status[row] != _SUPERSEDED:
+            self._roll(self.ts[row], self.amount[row], self.item_id[row], self.status[row], -1)
+        self.amount[row] = amount
+        self.status[row] = code
+        if code != _SUPERSEDED:
+            self._roll(self.ts[row], amount, self.item_id[row], code, 1)
+        return True
+
+    def add_order(self, order: dict) -> bool:
+        """Record a BASE order payload. Returns True when rows were added or changed."""
+        key = str(order.get("unique_key") or "")
+        if not key:
+            return False
+        with self._lock:
+            ts = int(order.get("ordered") or 0)
+            order_status = order.get("dispatch_status")
+            order_code = self._status_code(order_status)
+            lines = order.get("order_items")
+            prev = self._orders.get(key)
+            start, count = (prev >> _LINE_BITS, prev & _LINE_MASK) if prev is not None else (0, 0)
+
+            if isinstance(lines, list) and lines:
+                rows = []
+                for line in lines:
+                    total = line.get("total")
+                    if total is None:
+                        total = (line.get("price") or 0) * (line.get("amount") or 1)
+                    status = line.get("status")
+                    rows.append((int(total), int(line.get("item_id") or 0), self._status_code(status) if status else order_code))
+                if count == len(rows) and all(self.item_id[start + i] == item_id for i, (_, item_id, _) in enumerate(rows)):
+                    changed = False
+                    for i, (amount, _, code) in enumerate(rows):
+                        changed = self._rewrite(start + i, amount, code) | changed
+                    return changed
+                if prev is not None:
+                    for row in range(start, start + max(count, 1)):
+                        self._rewrite(row, 0, _SUPERSEDED)
+                self._orders[key] = len(self.ts) << _LINE_BITS | len(rows)
+                for amount, item_id, code in rows:
+                    self._append(ts, amount, item_id, code)
+                return True
+
+            total = int(order.get("total") or 0)
+            if prev is None:
+                self._orders[key] = len(self.ts) << _LINE_BITS
+                self._append(ts, total, 0, order_code)
+                return True
+            if count == 0:
+                return self._rewrite(start, total, order_code)
+            # Itemized order seen again in summary form: item totals stay as detailed, and
+            # items follow the order's status unless they were cancelled individually
+            cancelled = self._status_codes.get("cancelled")
+            changed = False
+            for row in range(start, start + count):
+                if order_status == "cancelled" or self.status[row] != cancelled:
+                    changed = self._rewrite(row, self.amount[row], order_code) | changed
+            return changed
+
+    def group_by(self, by: str, since: Optional[int] = None, until: Optional[int] = None) -> dict:
+        """Sum amounts and count rows grouped by `hour`, `item` or `status`.
+
+        Returns {key: (total, count)}. `since`/`until` bound the ordered timestamp
+        (inclusive/exclusive).
+        """
+        if by not in GROUP_KEYS:
+            raise ValueError(f"Unsupported group key: {by}")
+        with self._lock:
+            return self._group_by(by, since, until)
+
+    def _group_by(self, by: str, since: Optional[int], until: Optional[int]) -> dict:
+        bounded = since is not None or until is not None
+        if not bounded or (by == "hour" and (since or 0) % 3600 == 0 and (until or 0) % 3600 == 0):
+            return self._from_rollup(by, since, until)
+
+        keys = self.item_id if by == "item" else self.status if by == "status" else self.ts
+        lo = since if since is not None else -(1 << 63)
+        hi = until if until is not None else (1 << 63) - 1
+        hourly = by == "hour"
+
+        totals: dict[int, int] = {}
+        counts: dict[int, int] = {}
+        for k, amount, status, ts in zip(keys, self.amount, self.status, self.ts):
+            if status == _SUPERSEDED or not lo <= ts < hi:
+                continue
+            if hourly:
+                k -= k % 3600
+            totals[k] = totals.get(k, 0) + amount
+            counts[k] = counts.get(k, 0) + 1
+
+        return self._named(by, {k: (totals[k], counts[k]) for k in sorted(totals)})
+
+    def _from_rollup(self, by: str, since: Optional[int], until: Optional[int]) -> dict:
+        rollup = self._rollups[by]
+        keys = sorted(rollup)
+        if since is not None or until is not None:
+            lo = since if since is not None else -(1 << 63)
+            hi = until if until is not None else (1 << 63) - 1
+            keys = [k for k in keys if lo <= k < hi]
+        return self._named(by, {k: tuple(rollup[k]) for k in keys})
+
+    def _named(self, by: str, groups: dict) -> dict:
+        if by == "status":
+            return {self._status_names[k]: v for k, v in groups.items()}
+        return groups
@@ -0,0 +1,171 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import requests
+
+
+# Upper bound for read timeouts (the previous fixed value) and floor for adaptive ones
+_MAX_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_MAX_TIMEOUT_SECONDS", "15"))
+_MIN_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_MIN_TIMEOUT_SECONDS", "2"))
+_CONNECT_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT_SECONDS", "5"))
+
+# Retries for connect errors only (the request never reached BASE, so retrying is safe)
+_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+_RETRY_BASE_SECONDS = float(os.getenv("UPSTREAM_RETRY_BASE_SECONDS", "0.2"))
+_RETRY_MAX_SECONDS = float(os.getenv("UPSTREAM_RETRY_MAX_SECONDS", "2"))
+
+# Circuit breaker: open after N consecutive failures, probe again after the cool-down
+_BREAKER_FAILURE_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+_BREAKER_RESET_SECONDS = float(os.getenv("UPSTREAM_BREAKER_RESET_SECONDS", "30"))
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling upstream while an endpoint's breaker is open."""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"Circuit open for {endpoint}; retry in {int(retry_after) + 1}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class LatencyTracker:
+    """Rolling window of successful response latencies for one endpoint."""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def timeout(self) -> float:
+        """Read timeout derived from p99 latency (3x headroom), clamped to the configured range."""
+        if len(self._samples) < 20:
+            return _MAX_TIMEOUT_SECONDS
+        return min(_MAX_TIMEOUT_SECONDS, max(_MIN_TIMEOUT_SECONDS, self.percentile(99) * 3))
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open single probe after cool-down."""
+
+    def __init__(self):
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def before_call(self, endpoint: str):
+        if self.state == "closed":
+            return
+        elapsed = time.time() - self.opened_at
+        if self.state == "open" and elapsed >= _BREAKER_RESET_SECONDS:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return
+        raise CircuitOpenError(endpoint, max(0.0, _BREAKER_RESET_SECONDS - elapsed))
+
+    def record(self, ok: bool):
+        self._probing = False
+        if ok:
+            self.state = "closed"
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= _BREAKER_FAILURE_THRESHOLD:
+            self.state = "open"
+            self.opened_at = time.time()
+
+
+_BREAKERS: dict[str, CircuitBreaker] = {}
+_LATENCIES: dict[str, LatencyTracker] = {}
+_LOCK = threading.Lock()
+
+
+def _endpoint_state(endpoint: str):
+    with _LOCK:
+        breaker = _BREAKERS.setdefault(endpoint, CircuitBreaker())
+        latency = _LATENCIES.setdefault(endpoint, LatencyTracker())
+    return breaker, latency
+
+
+def _retry_delay(attempt: int) -> float:
+    # Full jitter: uniform over [0, base * 2^attempt], capped
+    return random.uniform(0, min(_RETRY_MAX_SECONDS, _RETRY_BASE_SECONDS * (2 ** attempt)))
+
+
+def resilient_get(endpoint: str, url: str, headers: dict, params: dict) -> requests.Response:
+    """GET `url` through the per-endpoint circuit breaker with adaptive timeout and retries.
+
+    `endpoint` names the breaker (e.g. "/1/items"). Raises CircuitOpenError without
+    calling upstream while the breaker is open, otherwise the usual requests exceptions.
+    Timeouts and 5xx responses count as failures; 4xx (including rate limits) do not.
+    """
+    breaker, latency = _endpoint_state(endpoint)
+    with _LOCK:
+        breaker.before_call(endpoint)
+
+    attempt = 0
+    while True:
+        start = time.monotonic()
+        try:
+            resp = requests.get(
+                url,
+                headers=headers,
+                params=params,
+                timeout=(_CONNECT_TIMEOUT_SECONDS, latency.timeout()),
+            )
+        except requests.ConnectionError:
+            # ConnectTimeout is a ConnectionError too; ReadTimeout is not and is never retried
+            if attempt < _MAX_RETRIES:
+                time.sleep(_retry_delay(attempt))
+                attempt += 1
+                continue
+            with _LOCK:
+                breaker.record(False)
+            raise
+        except Exception:
+            with _LOCK:
+                breaker.record(False)
+            raise
+
+        ok = resp.status_code < 500
+        with _LOCK:
+            breaker.record(ok)
+            if ok:
+                latency.observe(time.monotonic() - start)
+        return resp
+
+
+def breaker_states() -> dict:
+    """Snapshot of breaker state and timeout per endpoint (for /health)."""
+    with _LOCK:
+        return {
+            endpoint: {
+                "state": breaker.state,
+                "failures": breaker.failures,
+                "timeout_seconds": round(_LATENCIES[endpoint].timeout(), 3),
+                "p95_ms": _ms(_LATENCIES[endpoint].percentile(95)),
+            }
+            for endpoint, breaker in sorted(_BREAKERS.items())
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def breaker_closed(endpoint: str) -> bool:
+    """True unless the endpoint's breaker is open or half-open."""
+    with _LOCK:
+        breaker = _BREAKERS.get(endpoint)
+        return breaker is None or breaker.state == "closed"
@@ -0,0 +1,113 @@
+import os
+import time
+from typing import Optional
+
+import requests
+from fastapi import HTTPException
+
+from app import prefetch
+from app.api_client.resilience import CircuitOpenError, resilient_get
+
+
+# Backoff registry for rate limits (per access token). Shared by the orders and categories
+# routers; /items keeps its own and passes it explicitly.
+RATE_LIMIT_BACKOFF: dict[str, float] = {}  # token -> until_timestamp
+DEFAULT_BACKOFF_SECONDS = int(os.getenv("ORDERS_DEFAULT_BACKOFF_SECONDS", os.getenv("ITEMS_DEFAULT_BACKOFF_SECONDS", "60")))
+
+
+def guard_rate_limit(access_token: str, backoff: Optional[dict] = None):
+    """Raise 429 while the token is inside a recorded Retry-After window."""
+    backoff = RATE_LIMIT_BACKOFF if backoff is None else backoff
+    now = time.time()
+    until = backoff.get(access_token)
+    if until and now < until:
+        retry_after = int(until - now)
+        raise HTTPException(status_code=429, detail={"error": "rate_limited", "retry_after": retry_after}, headers={"Retry-After": str(retry_after)})
+
+
+def rate_limit_backoff(resp: requests.Response, data, default_seconds: int = DEFAULT_BACKOFF_SECONDS) -> Optional[int]:
+    """Seconds to back off if the upstream error is a rate limit, else None."""
+    # Propagate rate limit specifics when available
+    retry_after = resp.headers.get("Retry-After")
+    # Map BASE specific error codes for rate limit (they may return 400)
+    base_error_code = None
+    if isinstance(data, dict):
+        base_error_code = str(data.get("error") or "").strip()
+
+    # Compute conservative backoff windows
+    backoff_secs_calc = None
+    if base_error_code == "hour_api_limit":
+        # Wait until next hour (UTC-based). 00分でリセット。
+        now = time.time()
+        gm = time.gmtime(now)
+        sec_past_hour = gm.tm_min * 60 + gm.tm_sec
+        backoff_secs_calc = max(5, 3600 - sec_past_hour)
+    elif base_error_code == "day_api_limit":
+        # Wait until next day (UTC-based). 00:00でリセット。
+        now = time.time()
+        gm = time.gmtime(now)
+        sec_past_day = gm.tm_hour * 3600 + gm.tm_min * 60 + gm.tm_sec
+        backoff_secs_calc = max(60, 86400 - sec_past_day)
+
+    if resp.status_code == 429 or retry_after or backoff_secs_calc is not None:
+        try:
+            return int(retry_after) if (retry_after and retry_after.isdigit()) else (backoff_secs_calc if backoff_secs_calc is not None else default_seconds)
+        except Exception:
+            return default_seconds
+    return None
+
+
+def fetch_json(
+    base_api_url: str,
+    access_token: str,
+    path: str,
+    params: dict,
+    endpoint: Optional[str] = None,
+    backoff: Optional[dict] = None,
+    default_backoff: int = DEFAULT_BACKOFF_SECONDS,
+):
+    """GET an upstream BASE endpoint and return the parsed body (or {"raw": text}).
+
+    `endpoint` names the circuit breaker when `path` embeds an id (defaults to `path`).
+    Errors become HTTPExceptions: 503 while the circuit is open, 502 on network errors,
+    429 on rate limits (recording the window in `backoff`), else the upstream status.
+    """
+    backoff = RATE_LIMIT_BACKOFF if backoff is None else backoff
+    try:
+        resp = resilient_get(
+            endpoint or path,
+            f"{base_api_url}{path}",
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Accept": "application/json",
+                "User-Agent": "EC-LIVE/1.0 (+https://ec-live.onrender.com)",
+            },
+            params=params,
+        )
+    except CircuitOpenError as e:
+        retry_after = str(int(e.retry_after) + 1)
+        raise HTTPException(status_code=503, detail={"error": "upstream_unavailable", "retry_after": retry_after}, headers={"Retry-After": retry_after})
+    except requests.RequestException as e:
+        prefetch.record_upstream_call(access_token)  # may have reached BASE before failing
+        raise HTTPException(status_code=502, detail=f"Upstream error: {e}")
+    # Counted only once the breaker let the request out; rejected calls cost no quota
+    prefetch.record_upstream_call(access_token)
+
+    # Map BASE API response appropriately (robust to non-JSON bodies)
+    data = None
+    if "application/json" in resp.headers.get("Content-Type", "").lower():
+        try:
+            data = resp.json()
+        except ValueError:
+            data = None
+
+    if resp.status_code >= 400:
+        detail = data if data is not None else (resp.text or f"HTTP {resp.status_code}")
+        backoff_secs = rate_limit_backoff(resp, data, default_backoff)
+        if backoff_secs is not None:
+            backoff[access_token] = time.time() + max(backoff_secs, 1)
+            retry_after = resp.headers.get("Retry-After") or str(backoff_secs)
+            raise HTTPException(status_code=429, detail=detail, headers={"Retry-After": retry_after})
+        raise HTTPException(status_code=resp.status_code, detail=detail)
+
+    return data if data is not None else {"raw": resp.text}
@@ -0,0 +1,48 @@
+import time
+from typing import Optional
+
+from fastapi import HTTPException, Response
+
+
+def last_good(store: dict, key: str, max_age: float) -> Optional[dict]:
+    """Return the last successful cache entry for `key` if it is younger than `max_age`.
+
+    Last-good stores hold the same entry objects as the regular caches but are only
+    consulted when upstream cannot be asked (rate-limit backoff, open circuit), so they
+    outlive the normal TTL.
+    """
+    entry = store.get(key)
+    if entry and (time.time() - entry["ts"]) <= max_age:
+        return entry
+    return None
+
+
+def degraded_response(entry: dict, reason: str, retry_after: Optional[str] = None) -> Response:
+    """Serve a cached entry's body marked as degraded.
+
+    Headers: X-Degraded (why upstream was skipped), Age (seconds since the data was
+    fetched), Warning 110 (stale) and Retry-After when known.
+    """
+    age = max(0, int(time.time() - entry["ts"]))
+    headers = {"X-Degraded": reason, "Age": str(age), "Warning": '110 - "Response is Stale"'}
+    if retry_after:
+        headers["Retry-After"] = str(retry_after)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+
+def degraded_or_raise(good: Optional[dict], e: HTTPException) -> Response:
+    """Serve `good` (a cached entry) when upstream is rate-limited or unavailable, else re-raise `e`.
+
+    Only a 503 raised for an open circuit breaker (detail error "upstream_unavailable")
+    is marked with X-Upstream-Circuit; a 503 sent by BASE itself is just unavailable.
+    """
+    retry_after = (e.headers or {}).get("Retry-After")
+    if good and e.status_code == 429:
+        return degraded_response(good, "rate_limited", retry_after)
+    if good and e.status_code == 503:
+        circuit = isinstance(e.detail, dict) and e.detail.get("error") == "upstream_unavailable"
+        stale = degraded_response(good, "circuit_open" if circuit else "upstream_unavailable", retry_after)
+        if circuit:
+            stale.headers["X-Upstream-Circuit"] = "open"
+        return stale
+    raise e
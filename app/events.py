@@ -0,0 +1,59 @@
+import asyncio
+import threading
+
+
+class ChangeSignal:
+    """Per-key change counter that async handlers can wait on.
+
+    Sync route handlers (running in the threadpool) call `bump(key)` when data
+    behind `key` changes; async long-poll handlers `await wait(key, seen, timeout)`
+    without holding a worker thread.
+    """
+
+    def __init__(self):
+        self._versions: dict[str, int] = {}
+        self._waiters: list = []  # (loop, future)
+        self._lock = threading.Lock()
+
+    def version(self, key: str) -> int:
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def bump(self, key: str) -> int:
+        with self._lock:
+            version = self._versions[key] = self._versions.get(key, 0) + 1
+            waiters, self._waiters = self._waiters, []
+        for loop, fut in waiters:
+            loop.call_soon_threadsafe(_wake, fut)
+        return version
+
+    async def wait(self, key: str, seen: int, timeout: float) -> int:
+        """Wait until the version of `key` differs from `seen` or `timeout` elapses."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            with self._lock:
+                current = self._versions.get(key, 0)
+                if current != seen:
+                    return current
+                fut = loop.create_future()
+                self._waiters.append((loop, fut))
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return current
+            try:
+                await asyncio.wait_for(fut, remaining)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    if (loop, fut) in self._waiters:
+                        self._waiters.remove((loop, fut))
+                    return self._versions.get(key, 0)
+
+
+def _wake(fut):
+    if not fut.done():
+        fut.set_result(None)
+
+
+# Data shown on the overlay changed (orders recorded, snapshot items updated, pin moved)
+overlay_changes = ChangeSignal()
@@ -1,13 +1,20 @@
 from fastapi import FastAPI, HTTPException, Query
 from pydantic import BaseModel
 from app.api_client.base_api_client import BaseAPIClient
+from app.api_client.resilience import breaker_states
+from app.admission import AdmissionMiddleware, admission_stats
+from app.prefetch import prefetch_stats
 from app.config import RuntimeConfig
 from app.routers.items import router as items_router
 from app.routers.auth import router as auth_router
 from app.routers.orders import router as orders_router
+from app.routers.categories import router as categories_router
+from app.routers.overlay import router as overlay_router
+from app.routers.alerts import router as alerts_router
 from typing import Optional
 
 app = FastAPI(title="EC-LIVE", version="0.1.0")
+app.add_middleware(AdmissionMiddleware)
 
 # ランタイム設定とクライアント初期化
 config = RuntimeConfig()
@@ -17,11 +24,17 @@ client = BaseAPIClient(config.api_base_url, config.api_key)
 app.include_router(items_router)
 app.include_router(auth_router)
 app.include_router(orders_router)
+app.include_router(categories_router)
+app.include_router(overlay_router)
+app.include_router(alerts_router)
 
 # Also expose the same routers under "/api" prefix for compatibility
 app.include_router(items_router, prefix="/api")
 app.include_router(auth_router, prefix="/api")
 app.include_router(orders_router, prefix="/api")
+app.include_router(categories_router, prefix="/api")
+app.include_router(overlay_router, prefix="/api")
+app.include_router(alerts_router, prefix="/api")
 
 
 class APIConfigIn(BaseModel):
@@ -34,8 +47,10 @@ def read_root():
     return {"message": "EC-LIVE API running"}
 
 
+# Health/metrics handlers are async: they run on the event loop and never queue
+# behind upstream-bound handlers in the threadpool.
 @app.get("/health")
-def health():
+async def health():
     test = client.test_connection()
     return {
         "status": "ok",
@@ -46,22 +61,30 @@ def health():
             "api_key_set": bool(config.api_key),
         },
         "connection": test,
+        "upstream": breaker_states(),
     }
 
 
 @app.get("/healthz")
-def healthz():
+async def healthz():
     return {"ok": True}
 
 
 @app.get("/api/healthz")
-def healthz_alias():
+async def healthz_alias():
     """Alias for health checks under /api prefix.
     Some platforms/proxies may route prefixed paths differently.
     """
     return {"ok": True}
 
 
+@app.get("/metrics")
+@app.get("/api/metrics")
+async def metrics():
+    """Admission control (active/queued/shed per route), upstream breaker state and prefetch hit rate."""
+    return {"admission": admission_stats(), "upstream": breaker_states(), "prefetch": prefetch_stats()}
+
+
 @app.get("/config")
 def get_config():
     return {"config": config.masked()}
@@ -0,0 +1,69 @@
+import os
+import time
+from typing import Callable, Optional
+
+from fastapi import Request
+
+from app import prefetch
+from app.api_client.resilience import breaker_closed
+from app.degraded import last_good
+
+
+# Shared plumbing of the cached upstream list routes (/items, /orders). Each router keeps
+# its own cache and last-good dicts of {"ts", "body", "count"} entries and its own TTLs;
+# TTLs are passed per call so they can be changed at runtime.
+
+
+def cache_key(access_token: str, params: dict, prefix: str = "") -> str:
+    key_parts = [f"{k}={v}" for k, v in sorted(params.items())]
+    return f"{prefix}{access_token}|{'&'.join(key_parts)}"
+
+
+def fresh_entry(cache: dict, key: str, ttl: float) -> Optional[dict]:
+    """Cached entry for `key` if it is younger than `ttl` seconds."""
+    entry = cache.get(key)
+    if entry is not None and (time.time() - entry["ts"]) <= ttl:
+        return entry
+    return None
+
+
+def stale_entry(store: dict, query_params, param_names, max_age: float, prefix: str = "") -> Optional[dict]:
+    """Last good entry for a shed request's query params (admission stale provider)."""
+    access_token = os.getenv("BASE_ACCESS_TOKEN")
+    if not access_token:
+        return None
+    params = {k: v for k, v in query_params.items() if k in param_names}
+    return last_good(store, cache_key(access_token, params, prefix), max_age)
+
+
+def observe_paging(
+    route: str,
+    upstream_path: str,
+    request: Optional[Request],
+    access_token: str,
+    params: dict,
+    count: Optional[int],
+    cache: dict,
+    ttl: float,
+    prefix: str,
+    fetch: Callable[[dict], object],
+    backoff: dict,
+):
+    """Feed the prefetcher so sequential ?offset= paging gets page N+1 warmed in the background.
+
+    `count` is the number of records on the page just served; a short page is the last
+    one, so nothing is prefetched after it.
+    """
+    client = request.client.host if request is not None and request.client else "-"
+    prefetch.observe(
+        route,
+        access_token,
+        client,
+        params,
+        count,
+        default_limit=20,
+        cache_key=lambda p: cache_key(access_token, p, prefix),
+        is_cached=lambda key: fresh_entry(cache, key, ttl) is not None,
+        fetch=fetch,
+        blocked=lambda: backoff.get(access_token, 0) > time.time() or not breaker_closed(upstream_path),
+    )
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+# Upstream budget: prefetching stops once this share of the hourly BASE limit is used
+_HOURLY_API_LIMIT = int(os.getenv("BASE_HOURLY_API_LIMIT", "5000"))
+_QUOTA_FRACTION = float(os.getenv("PREFETCH_QUOTA_FRACTION", "0.5"))
+_ENABLED = os.getenv("PREFETCH_ENABLED", "1") not in ("0", "false", "False")
+
+# Low priority: one background worker and only a few pages in flight at once
+_MAX_PENDING = 4
+_MAX_STREAMS = 1000
+_MAX_PREFETCHED = 1000
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+
+_STREAMS: "OrderedDict[tuple, int]" = OrderedDict()  # (route, token, client, other params) -> last offset
+_PENDING: set = set()  # cache keys queued or being fetched
+_PREFETCHED: "OrderedDict[str, float]" = OrderedDict()  # cache key -> prefetch time, until served (oldest dropped)
+_UPSTREAM_CALLS: dict[str, tuple[int, int]] = {}  # token -> (hour bucket, calls)
+_STATS = {"issued": 0, "hits": 0, "failed": 0, "skipped_quota": 0, "skipped_busy": 0}
+
+
+def record_upstream_call(access_token: str):
+    """Count an upstream request against the token's hourly budget."""
+    bucket = int(time.time() // 3600)
+    with _LOCK:
+        hour, calls = _UPSTREAM_CALLS.get(access_token, (bucket, 0))
+        _UPSTREAM_CALLS[access_token] = (bucket, calls + 1 if hour == bucket else 1)
+
+
+def _quota_ok(access_token: str) -> bool:
+    bucket = int(time.time() // 3600)
+    hour, calls = _UPSTREAM_CALLS.get(access_token, (bucket, 0))
+    return hour != bucket or calls < _HOURLY_API_LIMIT * _QUOTA_FRACTION
+
+
+def record_hit(cache_key: str):
+    """Called on a cache hit; counts it when the entry was put there by a prefetch."""
+    if getattr(_LOCAL, "active", False):
+        return
+    with _LOCK:
+        if _PREFETCHED.pop(cache_key, None) is not None:
+            _STATS["hits"] += 1
+
+
+def observe(
+    route: str,
+    access_token: str,
+    client: str,
+    params: dict,
+    count: Optional[int],
+    default_limit: int,
+    cache_key: Callable[[dict], str],
+    is_cached: Callable[[str], bool],
+    fetch: Callable[[dict], object],
+    blocked: Callable[[], bool],
+):
+    """Track paging for one request and prefetch the next page when paging is sequential.
+
+    A stream is (route, token, client, params other than offset). When a request's
+    offset is exactly the previous offset + limit, page N+1 is fetched in the
+    background via `fetch(next_params)`, unless the page just served held fewer than
+    `limit` records (`count`; it was the last page), `blocked()` (rate-limit backoff,
+    open circuit), the hourly budget is tight, or enough prefetches are already pending.
+    """
+    if not _ENABLED or getattr(_LOCAL, "active", False):
+        return
+    limit = params.get("limit") or default_limit
+    offset = params.get("offset") or 0
+    stream = (route, access_token, client, tuple(sorted((k, v) for k, v in params.items() if k != "offset")))
+
+    with _LOCK:
+        prev = _STREAMS.get(stream)
+        _STREAMS[stream] = offset
+        _STREAMS.move_to_end(stream)
+        while len(_STREAMS) > _MAX_STREAMS:
+            _STREAMS.popitem(last=False)
+    if prev is None or offset != prev + limit or (count is not None and count < limit):
+        return
+
+    next_params = {**params, "offset": offset + limit}
+    next_key = cache_key(next_params)
+    if is_cached(next_key):
+        return
+    if blocked() or not _quota_ok(access_token):
+        with _LOCK:
+            _STATS["skipped_quota"] += 1
+        return
+    with _LOCK:
+        if next_key in _PENDING or len(_PENDING) >= _MAX_PENDING:
+            _STATS["skipped_busy"] += 1
+            return
+        _PENDING.add(next_key)
+    _EXECUTOR.submit(_run, next_key, fetch, next_params)
+
+
+def _run(key: str, fetch: Callable[[dict], object], params: dict):
+    _LOCAL.active = True
+    try:
+        fetch(params)
+        with _LOCK:
+            _PREFETCHED[key] = time.time()
+            _PREFETCHED.move_to_end(key)
+            while len(_PREFETCHED) > _MAX_PREFETCHED:
+                _PREFETCHED.popitem(last=False)
+            _STATS["issued"] += 1
+    except Exception:
+        with _LOCK:
+            _STATS["failed"] += 1
+    finally:
+        _LOCAL.active = False
+        with _LOCK:
+            _PENDING.discard(key)
+
+
+def prefetch_stats() -> dict:
+    with _LOCK:
+        stats = dict(_STATS)
+        stats["pending"] = len(_PENDING)
+    stats["hit_rate"] = round(stats["hits"] / stats["issued"], 3) if stats["issued"] else None
+    return stats
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Path, Query, HTTPException
+from pydantic import BaseModel
+import os
+from typing import Optional
+from app.analytics.alerts import METRICS, AlertEngine
+from app.events import overlay_changes
+from app.routers.orders import alert_engine
+
+
+router = APIRouter()
+
+
+class RuleIn(BaseModel):
+    metric: str
+    threshold: int
+    item_id: Optional[int] = None
+    label: Optional[str] = None
+
+
+def _engine() -> tuple[str, AlertEngine]:
+    access_token = os.getenv("BASE_ACCESS_TOKEN")
+    if not access_token:
+        raise HTTPException(status_code=500, detail="BASE_ACCESS_TOKEN is not set")
+    return access_token, alert_engine(access_token)
+
+
+@router.post("/alerts/rules")
+def add_rule(payload: RuleIn):
+    """Add a one-shot threshold rule.
+    metric: revenue (yen), order_count, or item_units (requires item_id).
+    Fires immediately if the metric is already at or past the threshold.
+    """
+    access_token, engine = _engine()
+    if payload.metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"'metric' must be one of {', '.join(METRICS)}")
+    if payload.metric == "item_units" and payload.item_id is None:
+        raise HTTPException(status_code=400, detail="item_units rules need 'item_id'")
+
+    rule, events = engine.add_rule(payload.metric, payload.threshold, payload.item_id, payload.label)
+    if events:
+        overlay_changes.bump(access_token)
+    return {"rule": rule, "events": events}
+
+
+@router.get("/alerts/rules")
+def list_rules():
+    """List rules with their fired state and the current metric values.
+    Values count orders placed since `since`: ALERTS_SINCE if set, else 00:00 of the
+    current day (ALERTS_UTC_OFFSET_HOURS, JST by default).
+    """
+    _, engine = _engine()
+    return {"since": engine.window(), "rules": list(engine.rules.values()), "values": dict(engine.values)}
+
+
+@router.delete("/alerts/rules/{rule_id}")
+def delete_rule(rule_id: int = Path(..., ge=1)):
+    _, engine = _engine()
+    if not engine.remove_rule(rule_id):
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return {"deleted": rule_id}
+
+
+@router.get("/alerts/events")
+def alert_events(since: int = Query(0, ge=0, description="Last event sequence the client has seen")):
+    """Alerts fired after event sequence `since` (most recent 500 are kept)."""
+    _, engine = _engine()
+    return {"seq": engine.seq, "events": engine.events_since(since)}
@@ -0,0 +1,155 @@
+from fastapi import APIRouter, Path, HTTPException
+import os
+import threading
+import time
+from app.api_client.upstream import fetch_json, guard_rate_limit
+
+
+router = APIRouter()
+
+# Categories change rarely; keep the tree and per-item mappings for a long time
+_CACHE_TTL_SECONDS = int(os.getenv("CATEGORIES_CACHE_TTL_SECONDS", "3600"))
+
+_CATEGORY_TREES: dict[str, dict] = {}  # token -> {"ts", "data", "children", "descendants"}
+_ITEM_CATEGORIES_CACHE: dict[str, dict] = {}  # "token|item_id" -> {"ts", "data"}
+
+# Reverse index (per access token): category_id -> item_ids, plus item_id -> category_ids
+# for replacing an item's mapping when its /1/item_categories detail is refreshed.
+_CATEGORY_ITEMS: dict[str, dict[int, set]] = {}
+_ITEM_CATEGORY_IDS: dict[str, dict[int, set]] = {}
+# category_id -> when its full item list was last paged in (see set_category_items)
+_CATEGORY_SYNCED: dict[str, dict[int, float]] = {}
+_INDEX_LOCK = threading.Lock()
+
+
+def _build_tree(categories: list) -> tuple[dict, dict]:
+    """Return (children, descendants) keyed by category_id.
+
+    BASE links categories through `number`/`parent_number` (0 = root). `descendants`
+    includes the category itself, so filtering by any node is a single set lookup.
+    """
+    by_number = {c.get("number"): c.get("category_id") for c in categories}
+    children: dict[int, list] = {0: []}
+    for c in sorted(categories, key=lambda c: (c.get("list_order") or 0, c.get("number") or 0)):
+        parent_id = by_number.get(c.get("parent_number")) if c.get("parent_number") else 0
+        children.setdefault(parent_id or 0, []).append(c.get("category_id"))
+        children.setdefault(c.get("category_id"), [])
+
+    descendants: dict[int, frozenset] = {}
+
+    def walk(cid: int) -> frozenset:
+        if cid not in descendants:
+            descendants[cid] = frozenset([cid]).union(*(walk(child) for child in children.get(cid, [])))
+        return descendants[cid]
+
+    for cid in children:
+        if cid:
+            walk(cid)
+    return children, descendants
+
+
+def get_category_tree(access_token: str) -> dict:
+    """Return the cached category tree entry, fetching /1/categories when missing or expired."""
+    now = time.time()
+    entry = _CATEGORY_TREES.get(access_token)
+    if entry and (now - entry["ts"]) <= _CACHE_TTL_SECONDS:
+        return entry
+
+    guard_rate_limit(access_token)
+    base_api_url = os.getenv("BASE_API_URL", "https://api.thebase.in")
+    data = fetch_json(base_api_url, access_token, "/1/categories", {})
+    categories = data.get("categories") if isinstance(data.get("categories"), list) else []
+    children, descendants = _build_tree(categories)
+    entry = {"ts": now, "data": data, "children": children, "descendants": descendants}
+    _CATEGORY_TREES[access_token] = entry
+    return entry
+
+
+def record_item_categories(access_token: str, item_id: int, category_ids, replace: bool = False):
+    """Add (or with `replace`, set) the categories of an item in the reverse index."""
+    with _INDEX_LOCK:
+        by_category = _CATEGORY_ITEMS.setdefault(access_token, {})
+        by_item = _ITEM_CATEGORY_IDS.setdefault(access_token, {})
+        current = by_item.setdefault(item_id, set())
+        if replace:
+            for cid in current - set(category_ids):
+                by_category.get(cid, set()).discard(item_id)
+            current.clear()
+        for cid in category_ids:
+            current.add(cid)
+            by_category.setdefault(cid, set()).add(item_id)
+
+
+def set_category_items(access_token: str, category_id: int, item_ids):
+    """Replace a category's indexed items with a complete listing and mark it synced."""
+    item_ids = set(item_ids)
+    with _INDEX_LOCK:
+        by_category = _CATEGORY_ITEMS.setdefault(access_token, {})
+        by_item = _ITEM_CATEGORY_IDS.setdefault(access_token, {})
+        for item_id in by_category.get(category_id, set()) - item_ids:
+            by_item.get(item_id, set()).discard(category_id)
+        for item_id in item_ids:
+            by_item.setdefault(item_id, set()).add(category_id)
+        by_category[category_id] = item_ids
+        _CATEGORY_SYNCED.setdefault(access_token, {})[category_id] = time.time()
+
+
+def unsynced_categories(access_token: str, category_ids) -> list:
+    """Categories whose item list was never synced, or not within the long TTL."""
+    now = time.time()
+    with _INDEX_LOCK:
+        synced = _CATEGORY_SYNCED.get(access_token, {})
+        return sorted(cid for cid in category_ids if now - synced.get(cid, 0) > _CACHE_TTL_SECONDS)
+
+
+def items_in_categories(access_token: str, category_ids) -> set:
+    """Union of item_ids indexed under any of `category_ids`."""
+    with _INDEX_LOCK:
+        by_category = _CATEGORY_ITEMS.get(access_token, {})
+        return set().union(*(by_category.get(cid, ()) for cid in category_ids))
+
+
+def _nest(children: dict, by_id: dict, parent_id: int) -> list:
+    return [{**by_id[cid], "children": _nest(children, by_id, cid)} for cid in children.get(parent_id, []) if cid in by_id]
+
+
+@router.get("/categories")
+def list_categories():
+    """Proxy to BASE API /1/categories with a long-TTL cache.
+    Adds `tree`: categories nested by parent_number with `children` lists.
+    """
+    access_token = os.getenv("BASE_ACCESS_TOKEN")
+    if not access_token:
+        raise HTTPException(status_code=500, detail="BASE_ACCESS_TOKEN is not set")
+
+    entry = get_category_tree(access_token)
+    by_id = {c.get("category_id"): c for c in entry["data"].get("categories") or []}
+    return {**entry["data"], "tree": _nest(entry["children"], by_id, 0)}
+
+
+@router.get("/item_categories/detail/{item_id}")
+def item_categories_detail(item_id: int = Path(..., ge=1)):
+    """Proxy to BASE API /1/item_categories/detail/:item_id with a long-TTL cache.
+    Results also feed the category -> items reverse index used by /items/by_category.
+    """
+    access_token = os.getenv("BASE_ACCESS_TOKEN")
+    if not access_token:
+        raise HTTPException(status_code=500, detail="BASE_ACCESS_TOKEN is not set")
+
+    now = time.time()
+    cache_key = f"{access_token}|{item_id}"
+    entry = _ITEM_CATEGORIES_CACHE.get(cache_key)
+    if entry and (now - entry["ts"]) <= _CACHE_TTL_SECONDS:
+        return entry["data"]
+
+    guard_rate_limit(access_token)
+    base_api_url = os.getenv("BASE_API_URL", "https://api.thebase.in")
+    data = fetch_json(
+        base_api_url, access_token, f"/1/item_categories/detail/{item_id}", {}, endpoint="/1/item_categories/detail"
+    )
+
+    links = data.get("item_categories")
+    if isinstance(links, list):
+        record_item_categories(access_token, item_id, [l.get("category_id") for l in links if isinstance(l, dict)], replace=True)
+    _ITEM_CATEGORIES_CACHE[cache_key] = {"ts": now, "data": data}
+    return data
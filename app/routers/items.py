@@ -1,8 +1,19 @@
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Query, HTTPException, Request, Response
+import json
 import os
-import requests
+import re
 from typing import Optional
+from collections import OrderedDict
+import threading
 import time
+from app.api_client.upstream import fetch_json, guard_rate_limit
+from app.routers.categories import get_category_tree, items_in_categories, record_item_categories, set_category_items, unsynced_categories
+from app.events import overlay_changes
+from app.admission import register_stale_provider
+from app.degraded import degraded_or_raise, last_good
+from app import page_cache, prefetch
+from app.schemas.item import ITEM_ADAPTER, ITEM_LIST_ADAPTER
+from app.schemas.page import validate_records
 
 
 router = APIRouter()
@@ -15,9 +26,170 @@ _CACHE_TTL_SECONDS = int(os.getenv("ITEMS_CACHE_TTL_SECONDS", "30"))
 _RATE_LIMIT_BACKOFF: dict[str, float] = {}  # token -> until_timestamp
 _DEFAULT_BACKOFF_SECONDS = int(os.getenv("ITEMS_DEFAULT_BACKOFF_SECONDS", "60"))
 
+# Last successful response per cache key, kept past the TTL for degraded mode.
+# Default covers a full day_api_limit lockout.
+_ITEMS_LAST_GOOD: dict[str, dict] = {}
+_LAST_GOOD_MAX_AGE_SECONDS = int(os.getenv("ITEMS_LAST_GOOD_MAX_AGE_SECONDS", "86400"))
+
+# Versioned snapshot of every item seen through /items (per access token).
+# Entries are kept in change order so /items/changes only walks what changed.
+_ITEMS_SNAPSHOT: dict[str, "OrderedDict[int, dict]"] = {}  # token -> item_id -> {"seq", "op", "item"}
+_ITEMS_SEQ: dict[str, int] = {}  # token -> last assigned change sequence
+_SNAPSHOT_LOCK = threading.Lock()
+
+# item_id -> newest copy of the item from any cached /items page or detail lookup (per
+# access token), so /items/detail answers list-to-detail clicks without an upstream call.
+# Guarded by _SNAPSHOT_LOCK.
+_ITEM_INDEX: dict[str, dict[int, dict]] = {}  # token -> item_id -> {"ts", "item"}
+_DETAIL_MAX_AGE_SECONDS = int(os.getenv("ITEMS_DETAIL_MAX_AGE_SECONDS", str(_CACHE_TTL_SECONDS)))
+
+
+# Image URL fields (img1_origin, img2_76, ...) depend on the request's max_image_no/image_size,
+# so they are left out when deciding whether an item changed
+_IMAGE_FIELD = re.compile(r"^img\d+_")
+
+# Page size used when paging a whole category into the category -> items index, and how
+# many categories one /items/by_category request may sync (the rest wait for later requests)
+_CATEGORY_SYNC_PAGE_SIZE = 100
+_CATEGORY_SYNC_MAX_PER_REQUEST = int(os.getenv("ITEMS_CATEGORY_SYNC_MAX_PER_REQUEST", "5"))
+
+_LIST_PARAMS = ("visible", "order", "sort", "limit", "offset", "category_id", "max_image_no", "image_size")
+
+
+def _stale_items(query_params) -> Optional[dict]:
+    """Last good /items page for these query params (used when shedding load)."""
+    return page_cache.stale_entry(_ITEMS_LAST_GOOD, query_params, _LIST_PARAMS, _LAST_GOOD_MAX_AGE_SECONDS)
+
+
+register_stale_provider("/items", _stale_items)
+
+
+def snapshot_item(access_token: str, item_id: int) -> Optional[dict]:
+    """Current snapshot copy of an item seen through /items (None if unknown or deleted)."""
+    with _SNAPSHOT_LOCK:
+        entry = (_ITEMS_SNAPSHOT.get(access_token) or {}).get(item_id)
+        return entry["item"] if entry else None
+
+
+def _content(item: dict) -> dict:
+    return {k: v for k, v in item.items() if not _IMAGE_FIELD.match(k)}
+
+
+def _record_items(access_token: str, params: dict, result: dict):
+    """Merge an upstream /1/items page into the versioned snapshot.
+
+    Items whose payload differs from the stored copy get a new sequence number; image
+    fields alone (which vary with max_image_no/image_size) are merged in without one.
+    Deletions are only inferred from a complete, unfiltered listing (first page,
+    shorter than the page size), since a missing item on any other page may just
+    have moved to a neighbouring page.
+    """
+    items = result.get("items") if isinstance(result, dict) else None
+    if not isinstance(items, list):
+        return
+    # The delta feed serves normalized records (ints as ints, unknown fields kept). Items
+    # failing the schema are kept as sent: dropping them would read as deletions below.
+    items = validate_records(items, ITEM_ADAPTER, ITEM_LIST_ADAPTER, mode="lenient")
+
+    with _SNAPSHOT_LOCK:
+        snapshot = _ITEMS_SNAPSHOT.setdefault(access_token, OrderedDict())
+        seq = _ITEMS_SEQ.get(access_token, 0)
+        seen = set()
+        for item in items:
+            if not isinstance(item, dict) or item.get("item_id") is None:
+                continue
+            item_id = item["item_id"]
+            if isinstance(item_id, str) and item_id.isdigit():
+                item_id = int(item_id)  # unvalidated record
+            seen.add(item_id)
+            prev = snapshot.get(item_id)
+            if prev is not None and prev["op"] != "delete" and _content(prev["item"]) == _content(item):
+                if prev["item"] != item:
+                    snapshot[item_id] = {**prev, "item": {**prev["item"], **item}}
+                continue
+            seq += 1
+            op = "insert" if prev is None or prev["op"] == "delete" else "update"
+            snapshot[item_id] = {"seq": seq, "op": op, "item": item}
+            snapshot.move_to_end(item_id)
+
+        complete = (
+            not params.get("offset")
+            and "visible" not in params
+            and "category_id" not in params
+            and len(items) < params.get("limit", 20)
+        )
+        if complete:
+            index = _ITEM_INDEX.get(access_token) or {}
+            for item_id in [i for i, e in snapshot.items() if e["op"] != "delete" and i not in seen]:
+                seq += 1
+                snapshot[item_id] = {"seq": seq, "op": "delete", "item": None}
+                snapshot.move_to_end(item_id)
+                index.pop(item_id, None)
+
+        changed = seq != _ITEMS_SEQ.get(access_token, 0)
+        _ITEMS_SEQ[access_token] = seq
+
+    if changed:
+        overlay_changes.bump(access_token)
+
+
+def _index_items(access_token: str, items, ts: float):
+    """Point item_id -> item for every item of a cached page (newest copy wins)."""
+    if not isinstance(items, list):
+        return
+    with _SNAPSHOT_LOCK:
+        index = _ITEM_INDEX.setdefault(access_token, {})
+        for item in items:
+            if not isinstance(item, dict) or item.get("item_id") is None:
+                continue
+            prev = index.get(item["item_id"])
+            if prev is None or prev["ts"] <= ts:
+                index[item["item_id"]] = {"ts": ts, "item": item}
+
+
+def _index_body(entry: dict) -> bytes:
+    """Encoded {"item": ...} body of an index entry, built once per indexed copy."""
+    body = entry.get("body")
+    if body is None:
+        body = entry["body"] = json.dumps({"item": entry["item"]}, ensure_ascii=False).encode()
+    return body
+
+
+def _stale_item_detail(query_params) -> Optional[dict]:
+    """Indexed copy of an item within the last-good max age (used when shedding load)."""
+    access_token = os.getenv("BASE_ACCESS_TOKEN")
+    item_id = query_params.get("item_id")
+    if not access_token or not (item_id or "").isdigit():
+        return None
+    with _SNAPSHOT_LOCK:
+        entry = (_ITEM_INDEX.get(access_token) or {}).get(int(item_id))
+    if not entry or time.time() - entry["ts"] > _LAST_GOOD_MAX_AGE_SECONDS:
+        return None
+    return {"ts": entry["ts"], "body": _index_body(entry)}
+
+
+register_stale_provider("/items/detail", _stale_item_detail)
+
+
+def _observe_paging(request: Optional[Request], access_token: str, params: dict, count: Optional[int]):
+    page_cache.observe_paging(
+        "/items",
+        "/1/items",
+        request,
+        access_token,
+        params,
+        count,
+        _ITEMS_CACHE,
+        _CACHE_TTL_SECONDS,
+        "",
+        fetch=lambda p: list_items(None, **{k: p.get(k) for k in _LIST_PARAMS}),
+        backoff=_RATE_LIMIT_BACKOFF,
+    )
+
 
 @router.get("/items")
 def list_items(
+    request: Request,
     visible: Optional[int] = Query(None, ge=0, le=1),
     order: Optional[str] = Query(None),
     sort: Optional[str] = Query(None),
@@ -29,6 +201,8 @@ def list_items(
 ):
     """Proxy to BASE API items endpoint.
     Requires BASE_ACCESS_TOKEN set in environment.
+    While rate-limited or while the upstream circuit is open, the last good page for the
+    same query is served (marked with X-Degraded/Age headers) if one is available.
     """
     # Read env at request time to support dynamic changes and tests
     base_api_url = os.getenv("BASE_API_URL", "https://api.thebase.in")
@@ -52,85 +226,161 @@ def list_items(
         if v is not None
     }
 
-    # Global backoff check (avoid hitting upstream during Retry-After window)
+    # Cache lookup (only for successful prior responses)
     now = time.time()
-    until = _RATE_LIMIT_BACKOFF.get(access_token)
-    if until and now < until:
-        retry_after = int(until - now)
-        raise HTTPException(status_code=429, detail={"error": "rate_limited", "retry_after": retry_after}, headers={"Retry-After": str(retry_after)})
+    cache_key = page_cache.cache_key(access_token, params)
+    entry = page_cache.fresh_entry(_ITEMS_CACHE, cache_key, _CACHE_TTL_SECONDS)
+    if entry:
+        prefetch.record_hit(cache_key)
+        _observe_paging(request, access_token, params, entry.get("count"))
+        return Response(content=entry["body"], media_type="application/json")
 
-    # Cache lookup (only for successful prior responses)
-    key_parts = [f"{k}={v}" for k, v in sorted(params.items())]
-    cache_key = f"{access_token}|{'&'.join(key_parts)}"
-    entry = _ITEMS_CACHE.get(cache_key)
-    if entry and (now - entry["ts"]) <= _CACHE_TTL_SECONDS:
-        return entry["data"]
+    # Skip upstream during a Retry-After window or while the circuit is open, serving the
+    # last good page for this key, if any, instead of failing.
+    try:
+        guard_rate_limit(access_token, _RATE_LIMIT_BACKOFF)
+        result = fetch_json(
+            base_api_url, access_token, "/1/items", params, backoff=_RATE_LIMIT_BACKOFF, default_backoff=_DEFAULT_BACKOFF_SECONDS
+        )
+    except HTTPException as e:
+        return degraded_or_raise(last_good(_ITEMS_LAST_GOOD, cache_key, _LAST_GOOD_MAX_AGE_SECONDS), e)
+
+    # Store successful response in cache, with the body encoded once so cache hits are
+    # served as bytes (no per-request re-encoding or validation of the proxied page)
+    body = json.dumps(result, ensure_ascii=False).encode()
+    count = len(result["items"]) if isinstance(result.get("items"), list) else None
+    _ITEMS_CACHE[cache_key] = _ITEMS_LAST_GOOD[cache_key] = {"ts": now, "body": body, "count": count}
+
+    _index_items(access_token, result.get("items"), now)
+    _record_items(access_token, params, result)
+    if category_id is not None and isinstance(result.get("items"), list):
+        for item in result["items"]:
+            if isinstance(item, dict) and item.get("item_id") is not None:
+                record_item_categories(access_token, item["item_id"], [category_id])
+
+    _observe_paging(request, access_token, params, count)
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/items/detail")
+def item_detail(item_id: int = Query(..., ge=1)):
+    """Item detail, answered from the item_id index over cached /items pages.
+    Falls through to BASE API /1/items/detail/:item_id only when the item is not
+    indexed or its copy is older than ITEMS_DETAIL_MAX_AGE_SECONDS. While rate-limited
+    or while the upstream circuit is open, an older indexed copy is served as degraded.
+    """
+    base_api_url = os.getenv("BASE_API_URL", "https://api.thebase.in")
+    access_token = os.getenv("BASE_ACCESS_TOKEN")
+
+    if not access_token:
+        raise HTTPException(status_code=500, detail="BASE_ACCESS_TOKEN is not set")
+
+    now = time.time()
+    with _SNAPSHOT_LOCK:
+        entry = (_ITEM_INDEX.get(access_token) or {}).get(item_id)
+    if entry and now - entry["ts"] <= _DETAIL_MAX_AGE_SECONDS:
+        return Response(content=_index_body(entry), media_type="application/json")
 
     try:
-        resp = requests.get(
-            f"{base_api_url}/1/items",
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Accept": "application/json",
-                "User-Agent": "EC-LIVE/1.0 (+https://ec-live.onrender.com)",
-            },
-            params=params,
-            timeout=15,
+        guard_rate_limit(access_token, _RATE_LIMIT_BACKOFF)
+        data = fetch_json(
+            base_api_url,
+            access_token,
+            f"/1/items/detail/{item_id}",
+            {},
+            endpoint="/1/items/detail",
+            backoff=_RATE_LIMIT_BACKOFF,
+            default_backoff=_DEFAULT_BACKOFF_SECONDS,
         )
-    except requests.RequestException as e:
-        raise HTTPException(status_code=502, detail=f"Upstream error: {e}")
+    except HTTPException as e:
+        good = None
+        if entry and now - entry["ts"] <= _LAST_GOOD_MAX_AGE_SECONDS:
+            good = {"ts": entry["ts"], "body": _index_body(entry)}
+        return degraded_or_raise(good, e)
 
-    # Map BASE API response appropriately (robust to non-JSON bodies)
-    content_type = resp.headers.get("Content-Type", "")
-    data = None
-    if "application/json" in content_type.lower():
+    if isinstance(data.get("item"), dict):
+        _index_items(access_token, [data["item"]], now)
+    return Response(content=json.dumps(data, ensure_ascii=False).encode(), media_type="application/json")
+
+
+def _sync_category(access_token: str, category_id: int):
+    """Page through /1/items?category_id= and replace the category's indexed items."""
+    base_api_url = os.getenv("BASE_API_URL", "https://api.thebase.in")
+    item_ids = []
+    offset = 0
+    while True:
+        params = {"category_id": category_id, "limit": _CATEGORY_SYNC_PAGE_SIZE, "offset": offset}
+        guard_rate_limit(access_token, _RATE_LIMIT_BACKOFF)
+        data = fetch_json(
+            base_api_url, access_token, "/1/items", params, backoff=_RATE_LIMIT_BACKOFF, default_backoff=_DEFAULT_BACKOFF_SECONDS
+        )
+        items = data.get("items") if isinstance(data.get("items"), list) else []
+        _index_items(access_token, items, time.time())
+        _record_items(access_token, params, data)
+        item_ids += [i["item_id"] for i in items if isinstance(i, dict) and i.get("item_id") is not None]
+        if len(items) < _CATEGORY_SYNC_PAGE_SIZE:
+            break
+        offset += _CATEGORY_SYNC_PAGE_SIZE
+    set_category_items(access_token, category_id, item_ids)
+
+
+@router.get("/items/by_category")
+def items_by_category(
+    category_id: int = Query(..., ge=1),
+    descendants: bool = Query(True, description="Include items of all descendant categories"),
+):
+    """Filter items by category locally.
+    Uses the cached category tree and the category -> items index; item bodies come
+    from the /items snapshot. Categories not synced within the long TTL are paged in
+    from /1/items?category_id= first (at most ITEMS_CATEGORY_SYNC_MAX_PER_REQUEST per
+    request), so repeat filters make no upstream calls. `complete` is false when categories
+    were left for a later request or a sync failed (e.g. rate limited); results may be partial.
+    """
+    access_token = os.getenv("BASE_ACCESS_TOKEN")
+    if not access_token:
+        raise HTTPException(status_code=500, detail="BASE_ACCESS_TOKEN is not set")
+
+    category_ids = {category_id}
+    if descendants:
+        category_ids = get_category_tree(access_token)["descendants"].get(category_id, category_ids)
+
+    pending = unsynced_categories(access_token, category_ids)
+    complete = len(pending) <= _CATEGORY_SYNC_MAX_PER_REQUEST
+    for cid in pending[:_CATEGORY_SYNC_MAX_PER_REQUEST]:
         try:
-            data = resp.json()
-        except ValueError:
-            data = None
-
-    if resp.status_code >= 400:
-        detail = data if data is not None else (resp.text or f"HTTP {resp.status_code}")
-        # Propagate rate limit specifics when available
-        retry_after = resp.headers.get("Retry-After")
-        # Map BASE specific error codes for rate limit (they may return 400)
-        base_error_code = None
-        if isinstance(data, dict):
-            base_error_code = str(data.get("error") or "").strip()
-
-        # Compute conservative backoff windows
-        backoff_secs_calc = None
-        if base_error_code == "hour_api_limit":
-            # Wait until next hour (UTC-based). 00分でリセット。
-            now = time.time()
-            gm = time.gmtime(now)
-            sec_past_hour = gm.tm_min * 60 + gm.tm_sec
-            backoff_secs_calc = max(5, 3600 - sec_past_hour)
-        elif base_error_code == "day_api_limit":
-            # Wait until next day (UTC-based). 00:00でリセット。
-            now = time.time()
-            gm = time.gmtime(now)
-            sec_past_day = gm.tm_hour * 3600 + gm.tm_min * 60 + gm.tm_sec
-            backoff_secs_calc = max(60, 86400 - sec_past_day)
-
-        # Handle rate limit and raise
-        if resp.status_code == 429 or retry_after or backoff_secs_calc is not None:
-            # Record backoff window
-            try:
-                backoff_secs = int(retry_after) if (retry_after and retry_after.isdigit()) else (backoff_secs_calc if backoff_secs_calc is not None else _DEFAULT_BACKOFF_SECONDS)
-            except Exception:
-                backoff_secs = _DEFAULT_BACKOFF_SECONDS
-            _RATE_LIMIT_BACKOFF[access_token] = time.time() + max(backoff_secs, 1)
-            raise HTTPException(status_code=429, detail=detail, headers={"Retry-After": retry_after or str(backoff_secs)})
-
-        raise HTTPException(status_code=resp.status_code, detail=detail)
-
-    result = data if data is not None else {"raw": resp.text}
-
-    # Store successful response in cache
-    try:
-        _ITEMS_CACHE[cache_key] = {"ts": now, "data": result}
-    except Exception:
-        pass
+            _sync_category(access_token, cid)
+        except HTTPException:
+            complete = False
+            break
+    item_ids = sorted(items_in_categories(access_token, category_ids))
+
+    with _SNAPSHOT_LOCK:
+        snapshot = _ITEMS_SNAPSHOT.get(access_token) or {}
+        items = [snapshot[i]["item"] for i in item_ids if i in snapshot and snapshot[i]["op"] != "delete"]
+    return {"category_ids": sorted(category_ids), "item_ids": item_ids, "items": items, "complete": complete}
+
+
+@router.get("/items/changes")
+def item_changes(since: int = Query(0, ge=0, description="Last change sequence the client has seen")):
+    """Return items inserted, updated or deleted after change sequence `since`.
+    Served from the local snapshot built by /items; never calls upstream.
+    Clients poll with the returned `seq` to receive only subsequent changes.
+    """
+    access_token = os.getenv("BASE_ACCESS_TOKEN")
+    if not access_token:
+        raise HTTPException(status_code=500, detail="BASE_ACCESS_TOKEN is not set")
+
+    with _SNAPSHOT_LOCK:
+        current = _ITEMS_SEQ.get(access_token, 0)
+        if since > current:
+            raise HTTPException(status_code=400, detail={"error": "bad_since", "seq": current})
+        changes = []
+        snapshot = _ITEMS_SNAPSHOT.get(access_token) or OrderedDict()
+        for item_id in reversed(snapshot):
+            entry = snapshot[item_id]
+            if entry["seq"] <= since:
+                break
+            changes.append({"item_id": item_id, **entry})
 
-    return result
+    changes.reverse()
+    return {"seq": current, "since": since, "changes": changes}
@@ -1,8 +1,23 @@
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Query, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import io
+import json
 import os
-import requests
 from typing import Optional
+import threading
 import time
+from app.analytics.alerts import AlertEngine
+from app.analytics.order_store import GROUP_KEYS, OrderStore
+from app.api_client.upstream import RATE_LIMIT_BACKOFF, fetch_json, guard_rate_limit
+from app.events import overlay_changes
+from app.admission import register_stale_provider
+from app.degraded import degraded_or_raise, last_good
+from app import page_cache, prefetch
+from app.schemas.order import ORDER_ADAPTER, ORDER_LIST_ADAPTER
+from app.schemas.page import validate_records
 
 
 router = APIRouter()
@@ -11,65 +26,128 @@ router = APIRouter()
 _ORDERS_CACHE: dict[str, dict] = {}
 _CACHE_TTL_SECONDS = int(os.getenv("ORDERS_CACHE_TTL_SECONDS", os.getenv("ITEMS_CACHE_TTL_SECONDS", "30")))
 
-# Backoff registry for rate limits (per access token)
-_RATE_LIMIT_BACKOFF: dict[str, float] = {}  # token -> until_timestamp
-_DEFAULT_BACKOFF_SECONDS = int(os.getenv("ORDERS_DEFAULT_BACKOFF_SECONDS", os.getenv("ITEMS_DEFAULT_BACKOFF_SECONDS", "60")))
+# Backoff registry for rate limits (per access token), shared with /categories
+_RATE_LIMIT_BACKOFF = RATE_LIMIT_BACKOFF
 
+# Last successful response per cache key, kept past the TTL for degraded mode
+_ORDERS_LAST_GOOD: dict[str, dict] = {}
+_LAST_GOOD_MAX_AGE_SECONDS = int(os.getenv("ORDERS_LAST_GOOD_MAX_AGE_SECONDS", os.getenv("ITEMS_LAST_GOOD_MAX_AGE_SECONDS", "86400")))
 
-def _guard_rate_limit(token: str):
-    now = time.time()
-    until = _RATE_LIMIT_BACKOFF.get(token)
-    if until and now < until:
-        retry_after = int(until - now)
-        raise HTTPException(status_code=429, detail={"error": "rate_limited", "retry_after": retry_after}, headers={"Retry-After": str(retry_after)})
+# Export paging: page size and how long an export may pause for a rate-limit window
+_EXPORT_PAGE_SIZE = 100
+_EXPORT_MAX_WAIT_SECONDS = int(os.getenv("ORDERS_EXPORT_MAX_WAIT_SECONDS", "300"))
+_EXPORT_ORDER_FIELDS = ["unique_key", "ordered", "dispatch_status", "payment", "total", "first_name", "last_name", "modified"]
+_EXPORT_ITEM_FIELDS = ["item_id", "variation_id", "title", "price", "amount", "item_total"]
 
 
-def _handle_upstream_error(resp: requests.Response, access_token: str):
-    content_type = resp.headers.get("Content-Type", "")
-    data = None
-    if "application/json" in content_type.lower():
-        try:
-            data = resp.json()
-        except ValueError:
-            data = None
-
-    if resp.status_code >= 400:
-        detail = data if data is not None else (resp.text or f"HTTP {resp.status_code}")
-        retry_after = resp.headers.get("Retry-After")
-        base_error_code = None
-        if isinstance(data, dict):
-            base_error_code = str(data.get("error") or "").strip()
-
-        backoff_secs_calc = None
-        if base_error_code == "hour_api_limit":
-            now = time.time()
-            gm = time.gmtime(now)
-            sec_past_hour = gm.tm_min * 60 + gm.tm_sec
-            backoff_secs_calc = max(5, 3600 - sec_past_hour)
-        elif base_error_code == "day_api_limit":
-            now = time.time()
-            gm = time.gmtime(now)
-            sec_past_day = gm.tm_hour * 3600 + gm.tm_min * 60 + gm.tm_sec
-            backoff_secs_calc = max(60, 86400 - sec_past_day)
-
-        if resp.status_code == 429 or retry_after or backoff_secs_calc is not None:
-            try:
-                backoff_secs = int(retry_after) if (retry_after and retry_after.isdigit()) else (backoff_secs_calc if backoff_secs_calc is not None else _DEFAULT_BACKOFF_SECONDS)
-            except Exception:
-                backoff_secs = _DEFAULT_BACKOFF_SECONDS
-            _RATE_LIMIT_BACKOFF[access_token] = time.time() + max(backoff_secs, 1)
-            raise HTTPException(status_code=429, detail=detail, headers={"Retry-After": retry_after or str(backoff_secs)})
-
-        raise HTTPException(status_code=resp.status_code, detail=detail)
+# Columnar order history per access token, fed by /orders and /orders/detail
+_ORDER_STORES: dict[str, OrderStore] = {}
+
+# Sales threshold alerts per access token, evaluated once per recorded order. Metrics
+# count orders placed since ALERTS_SINCE (unix seconds) when set, else since 00:00 of
+# the current day at ALERTS_UTC_OFFSET_HOURS (JST by default), rolling over daily.
+_ALERT_ENGINES: dict[str, AlertEngine] = {}
+_ALERTS_SINCE = int(os.getenv("ALERTS_SINCE")) if os.getenv("ALERTS_SINCE") else None
+_ALERTS_UTC_OFFSET_HOURS = float(os.getenv("ALERTS_UTC_OFFSET_HOURS", "9"))
+
+# Most recent orders per access token (newest first), compact fields for the overlay
+_RECENT_ORDERS: dict[str, "OrderedDict[str, dict]"] = {}
+_RECENT_ORDERS_SIZE = 20
+_RECENT_ORDER_FIELDS = ("unique_key", "ordered", "total", "dispatch_status")
+_RECENT_LOCK = threading.Lock()
+
+
+def order_store(access_token: str) -> Optional[OrderStore]:
+    """Columnar order history of a token, if any orders were recorded."""
+    return _ORDER_STORES.get(access_token)
+
+
+def alert_engine(access_token: str) -> AlertEngine:
+    """Alert engine of a token (created on first use)."""
+    engine = _ALERT_ENGINES.get(access_token)
+    if engine is None:
+        engine = _ALERT_ENGINES.setdefault(access_token, AlertEngine(_ALERTS_SINCE, _ALERTS_UTC_OFFSET_HOURS))
+    return engine
+
+
+def recent_orders(access_token: str, limit: int) -> list:
+    """Newest recorded orders (compact fields), newest first."""
+    with _RECENT_LOCK:
+        return list((_RECENT_ORDERS.get(access_token) or {}).values())[:limit]
+
+
+def _remember_recent(access_token: str, order: dict) -> bool:
+    key = order.get("unique_key")
+    if not key:
+        return False
+    summary = {k: order.get(k) for k in _RECENT_ORDER_FIELDS}
+    with _RECENT_LOCK:
+        recent = _RECENT_ORDERS.setdefault(access_token, OrderedDict())
+        if recent.get(key) == summary:
+            return False
+        if key not in recent and len(recent) >= _RECENT_ORDERS_SIZE:
+            oldest = min(recent.values(), key=lambda o: o["ordered"] or 0)
+            if (summary["ordered"] or 0) <= (oldest["ordered"] or 0):
+                return False
+            del recent[oldest["unique_key"]]
+        recent[key] = summary
+        ordered = sorted(recent.values(), key=lambda o: o["ordered"] or 0, reverse=True)
+        _RECENT_ORDERS[access_token] = OrderedDict((o["unique_key"], o) for o in ordered)
+        return True
+
+
+def _record_orders(access_token: str, orders):
+    if not isinstance(orders, list):
+        return
+    store = _ORDER_STORES.setdefault(access_token, OrderStore())
+    alerts = alert_engine(access_token)
+    changed = False
+    for order in validate_records(orders, ORDER_ADAPTER, ORDER_LIST_ADAPTER):
+        changed = store.add_order(order) | changed
+        changed = _remember_recent(access_token, order) | changed
+        changed = bool(alerts.ingest(order)) | changed
+    if changed:
+        overlay_changes.bump(access_token)
+
+
+_CACHE_KEY_PREFIX = "orders|"
+
+
+def _stale_orders(query_params) -> Optional[dict]:
+    """Last good /orders page for these query params (used when shedding load)."""
+    return page_cache.stale_entry(_ORDERS_LAST_GOOD, query_params, ("status", "limit", "offset"), _LAST_GOOD_MAX_AGE_SECONDS, _CACHE_KEY_PREFIX)
+
+
+register_stale_provider("/orders", _stale_orders)
+
+
+def _observe_paging(request: Optional[Request], access_token: str, params: dict, count: Optional[int]):
+    page_cache.observe_paging(
+        "/orders",
+        "/1/orders",
+        request,
+        access_token,
+        params,
+        count,
+        _ORDERS_CACHE,
+        _CACHE_TTL_SECONDS,
+        _CACHE_KEY_PREFIX,
+        fetch=lambda p: list_orders(None, status=p.get("status"), limit=p.get("limit"), offset=p.get("offset")),
+        backoff=_RATE_LIMIT_BACKOFF,
+    )
 
 
 @router.get("/orders")
 def list_orders(
+    request: Request,
     status: Optional[str] = Query(None, description="Order status filter"),
     limit: Optional[int] = Query(None, ge=1, le=100),
     offset: Optional[int] = Query(None, ge=0),
 ):
-    """Proxy to BASE API orders endpoint (/1/orders)."""
+    """Proxy to BASE API orders endpoint (/1/orders).
+    While rate-limited or while upstream is unavailable, the last good page for the
+    same query is served (marked with X-Degraded/Age headers) if one is available.
+    """
     base_api_url = os.getenv("BASE_API_URL", "https://api.thebase.in")
     access_token = os.getenv("BASE_ACCESS_TOKEN")
     if not access_token:
@@ -77,43 +155,27 @@ def list_orders(
 
     params = {k: v for k, v in {"status": status, "limit": limit, "offset": offset}.items() if v is not None}
 
-    _guard_rate_limit(access_token)
-
     # Cache
     now = time.time()
-    key_parts = [f"{k}={v}" for k, v in sorted(params.items())]
-    cache_key = f"orders|{access_token}|{'&'.join(key_parts)}"
-    entry = _ORDERS_CACHE.get(cache_key)
-    if entry and (now - entry["ts"]) <= _CACHE_TTL_SECONDS:
-        return entry["data"]
+    cache_key = page_cache.cache_key(access_token, params, _CACHE_KEY_PREFIX)
+    entry = page_cache.fresh_entry(_ORDERS_CACHE, cache_key, _CACHE_TTL_SECONDS)
+    if entry:
+        prefetch.record_hit(cache_key)
+        _observe_paging(request, access_token, params, entry.get("count"))
+        return Response(content=entry["body"], media_type="application/json")
 
     try:
-        resp = requests.get(
-            f"{base_api_url}/1/orders",
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Accept": "application/json",
-                "User-Agent": "EC-LIVE/1.0 (+https://ec-live.onrender.com)",
-            },
-            params=params,
-            timeout=15,
-        )
-    except requests.RequestException as e:
-        raise HTTPException(status_code=502, detail=f"Upstream error: {e}")
-
-    _handle_upstream_error(resp, access_token)
-
-    content_type = resp.headers.get("Content-Type", "")
-    if "application/json" in content_type.lower():
-        try:
-            data = resp.json()
-        except ValueError:
-            data = {"raw": resp.text}
-    else:
-        data = {"raw": resp.text}
+        guard_rate_limit(access_token)
+        data = fetch_json(base_api_url, access_token, "/1/orders", params)
+    except HTTPException as e:
+        return degraded_or_raise(last_good(_ORDERS_LAST_GOOD, cache_key, _LAST_GOOD_MAX_AGE_SECONDS), e)
 
-    _ORDERS_CACHE[cache_key] = {"ts": now, "data": data}
-    return data
+    body = json.dumps(data, ensure_ascii=False).encode()
+    count = len(data["orders"]) if isinstance(data.get("orders"), list) else None
+    _ORDERS_CACHE[cache_key] = _ORDERS_LAST_GOOD[cache_key] = {"ts": now, "body": body, "count": count}
+    _record_orders(access_token, data.get("orders"))
+    _observe_paging(request, access_token, params, count)
+    return Response(content=body, media_type="application/json")
 
 
 @router.get("/orders/detail")
@@ -124,31 +186,151 @@ def order_detail(order_id: int = Query(..., ge=1)):
     if not access_token:
         raise HTTPException(status_code=500, detail="BASE_ACCESS_TOKEN is not set")
 
-    _guard_rate_limit(access_token)
+    guard_rate_limit(access_token)
 
-    try:
-        resp = requests.get(
-            f"{base_api_url}/1/orders/detail",
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Accept": "application/json",
-                "User-Agent": "EC-LIVE/1.0 (+https://ec-live.onrender.com)",
-            },
-            params={"order_id": order_id},
-            timeout=15,
-        )
-    except requests.RequestException as e:
-        raise HTTPException(status_code=502, detail=f"Upstream error: {e}")
+    data = fetch_json(base_api_url, access_token, "/1/orders/detail", {"order_id": order_id})
+
+    _record_orders(access_token, [data.get("order")])
+    return data
 
-    _handle_upstream_error(resp, access_token)
 
-    content_type = resp.headers.get("Content-Type", "")
-    if "application/json" in content_type.lower():
+@router.get("/orders/aggregate")
+def aggregate_orders(
+    by: str = Query("hour", description="Group key: hour, item or status"),
+    since: Optional[int] = Query(None, ge=0, description="Ordered timestamp lower bound (unix seconds, inclusive)"),
+    until: Optional[int] = Query(None, ge=0, description="Ordered timestamp upper bound (unix seconds, exclusive)"),
+):
+    """Sum order amounts grouped by hour, item or status.
+    Computed locally from orders already fetched via /orders and /orders/detail.
+    Grouping by item is only itemized for orders seen through /orders/detail (others count as item_id 0).
+    """
+    access_token = os.getenv("BASE_ACCESS_TOKEN")
+    if not access_token:
+        raise HTTPException(status_code=500, detail="BASE_ACCESS_TOKEN is not set")
+    if by not in GROUP_KEYS:
+        raise HTTPException(status_code=400, detail=f"'by' must be one of {', '.join(GROUP_KEYS)}")
+
+    store = _ORDER_STORES.get(access_token) or OrderStore()
+    groups = store.group_by(by, since=since, until=until)
+    return {
+        "by": by,
+        "groups": [{"key": k, "total": total, "count": count} for k, (total, count) in groups.items()],
+    }
+
+
+def _backoff_remaining(token: str) -> float:
+    until = _RATE_LIMIT_BACKOFF.get(token)
+    return max(0.0, until - time.time()) if until else 0.0
+
+
+def _fetch_paused(base_api_url: str, access_token: str, path: str, params: dict) -> dict:
+    """Like fetch_json, but waits out rate-limit windows up to _EXPORT_MAX_WAIT_SECONDS."""
+    waited = 0.0
+    while True:
+        remaining = _backoff_remaining(access_token)
+        if remaining > 0:
+            if waited + remaining > _EXPORT_MAX_WAIT_SECONDS:
+                raise HTTPException(status_code=429, detail={"error": "rate_limited", "retry_after": int(remaining)})
+            time.sleep(remaining)
+            waited += remaining
+            continue
         try:
-            data = resp.json()
-        except ValueError:
-            data = {"raw": resp.text}
-    else:
-        data = {"raw": resp.text}
+            return fetch_json(base_api_url, access_token, path, params)
+        except HTTPException as e:
+            if e.status_code != 429 or _backoff_remaining(access_token) <= 0:
+                raise
 
-    return data
+
+def _export_rows(base_api_url: str, access_token: str, params: dict, details: bool):
+    """Yield export rows (dicts) page by page, prefetching the next page in the background."""
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        offset = 0
+        page = pool.submit(_fetch_paused, base_api_url, access_token, "/1/orders", {**params, "limit": _EXPORT_PAGE_SIZE, "offset": offset})
+        while page is not None:
+            orders = page.result().get("orders") or []
+            offset += _EXPORT_PAGE_SIZE
+            page = None
+            if len(orders) >= _EXPORT_PAGE_SIZE:
+                page = pool.submit(_fetch_paused, base_api_url, access_token, "/1/orders", {**params, "limit": _EXPORT_PAGE_SIZE, "offset": offset})
+
+            for order in orders:
+                row = {k: order.get(k) for k in _EXPORT_ORDER_FIELDS}
+                if not details:
+                    yield row
+                    continue
+                order_id = order.get("order_id") or order.get("unique_key")
+                detail = _fetch_paused(base_api_url, access_token, "/1/orders/detail", {"order_id": order_id}).get("order") or {}
+                for line in detail.get("order_items") or [{}]:
+                    yield {
+                        **row,
+                        "item_id": line.get("item_id"),
+                        "variation_id": line.get("variation_id"),
+                        "title": line.get("title"),
+                        "price": line.get("price"),
+                        "amount": line.get("amount"),
+                        "item_total": line.get("total"),
+                    }
+
+
+def _ndjson_lines(rows):
+    try:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+    except HTTPException as e:
+        yield json.dumps({"error": "export_aborted", "status": e.status_code, "detail": e.detail}, ensure_ascii=False) + "\n"
+
+
+def _csv_lines(rows, fields: list):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    try:
+        for row in rows:
+            writer.writerow(row)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    except HTTPException as e:
+        # Headers are already sent: flush what was written, mark the file as incomplete and
+        # abort the stream so the connection is reset instead of ending cleanly.
+        writer.writerow({fields[0]: f"#export_aborted status={e.status_code} detail={e.detail}"})
+        yield buf.getvalue()
+        raise
+    yield buf.getvalue()
+
+
+@router.get("/orders/export")
+def export_orders(
+    format: str = Query("ndjson", description="ndjson or csv"),
+    details: bool = Query(False, description="Include order items (one row per item, one upstream call per order)"),
+    status: Optional[str] = Query(None, description="Order status filter"),
+    start_ordered: Optional[str] = Query(None, description="Ordered date lower bound, passed through to BASE"),
+    end_ordered: Optional[str] = Query(None, description="Ordered date upper bound, passed through to BASE"),
+):
+    """Stream all matching orders as NDJSON or CSV.
+    Pages through /1/orders without caching, so memory stays flat regardless of export size.
+    Rate-limit windows pause the export (up to ORDERS_EXPORT_MAX_WAIT_SECONDS) instead of failing it.
+    """
+    base_api_url = os.getenv("BASE_API_URL", "https://api.thebase.in")
+    access_token = os.getenv("BASE_ACCESS_TOKEN")
+    if not access_token:
+        raise HTTPException(status_code=500, detail="BASE_ACCESS_TOKEN is not set")
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="'format' must be ndjson or csv")
+
+    remaining = _backoff_remaining(access_token)
+    if remaining > _EXPORT_MAX_WAIT_SECONDS:
+        retry_after = int(remaining)
+        raise HTTPException(status_code=429, detail={"error": "rate_limited", "retry_after": retry_after}, headers={"Retry-After": str(retry_after)})
+
+    params = {k: v for k, v in {"status": status, "start_ordered": start_ordered, "end_ordered": end_ordered}.items() if v is not None}
+    rows = _export_rows(base_api_url, access_token, params, details)
+
+    if format == "csv":
+        fields = _EXPORT_ORDER_FIELDS + (_EXPORT_ITEM_FIELDS if details else [])
+        return StreamingResponse(
+            _csv_lines(rows, fields),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="orders.csv"'},
+        )
+    return StreamingResponse(_ndjson_lines(rows), media_type="application/x-ndjson")
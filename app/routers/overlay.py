@@ -0,0 +1,118 @@
+from fastapi import APIRouter, Query, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+import json
+import os
+import threading
+import time
+from typing import Optional
+from app.events import overlay_changes
+from app.routers.items import snapshot_item
+from app.routers.orders import alert_engine, order_store, recent_orders
+
+
+router = APIRouter()
+
+_LATEST_ORDERS = int(os.getenv("OVERLAY_LATEST_ORDERS", "5"))
+_LATEST_ALERTS = 3
+_EXCLUDED_STATUSES = {"cancelled"}
+_PINNED_FIELDS = ("item_id", "title", "price", "stock", "img1_origin")
+
+_PINNED: dict[str, int] = {}  # token -> pinned item_id
+_FEEDS: dict[str, dict] = {}  # token -> {"version", "body"}
+_FEED_LOCK = threading.Lock()
+
+
+class PinIn(BaseModel):
+    item_id: Optional[int] = None
+
+
+def _build_payload(access_token: str, version: int) -> dict:
+    recent = recent_orders(access_token, _LATEST_ORDERS)
+
+    amount = count = 0
+    store = order_store(access_token)
+    if store is not None:
+        for status, (total, n) in store.group_by("status").items():
+            if status not in _EXCLUDED_STATUSES:
+                amount += total
+                count += n
+
+    pinned = None
+    item_id = _PINNED.get(access_token)
+    if item_id is not None:
+        item = snapshot_item(access_token, item_id)
+        if item:
+            pinned = {k: item.get(k) for k in _PINNED_FIELDS}
+        else:
+            pinned = {"item_id": item_id}
+
+    engine = alert_engine(access_token)
+    alerts = engine.events_since(max(0, engine.seq - _LATEST_ALERTS))
+
+    return {
+        "version": version,
+        "generated": int(time.time()),
+        "orders": recent,
+        "totals": {"amount": amount, "count": count},
+        "pinned": pinned,
+        "alerts": alerts,
+    }
+
+
+def _render(access_token: str) -> dict:
+    """Return the pre-serialized feed, rebuilding it only when the change version moved.
+    Takes the order/item/feed locks, so async callers run it in the threadpool.
+    """
+    version = overlay_changes.version(access_token)
+    feed = _FEEDS.get(access_token)
+    if feed and feed["version"] == version:
+        return feed
+    with _FEED_LOCK:
+        feed = _FEEDS.get(access_token)
+        if feed and feed["version"] == version:
+            return feed
+        body = json.dumps(_build_payload(access_token, version), ensure_ascii=False, separators=(",", ":")).encode()
+        feed = _FEEDS[access_token] = {"version": version, "body": body}
+        return feed
+
+
+@router.get("/overlay/feed")
+async def overlay_feed(
+    version: Optional[int] = Query(None, ge=0, description="Version the client already has; enables long-polling"),
+    timeout: float = Query(25, ge=0, le=60, description="Seconds to hold the request waiting for a change"),
+):
+    """Compact overlay payload: latest orders, totals, the pinned item and recent alerts.
+    Built from data already fetched by /orders and /items, once per change.
+    With `version`, the request is held until the data changes or `timeout` passes (then 304).
+    """
+    access_token = os.getenv("BASE_ACCESS_TOKEN")
+    if not access_token:
+        raise HTTPException(status_code=500, detail="BASE_ACCESS_TOKEN is not set")
+
+    if version is not None and version == overlay_changes.version(access_token):
+        await overlay_changes.wait(access_token, version, timeout)
+
+    # Only the version check and the wait run on the event loop; a rebuild takes locks
+    # that a long /orders/aggregate scan may hold
+    feed = _FEEDS.get(access_token)
+    if not feed or feed["version"] != overlay_changes.version(access_token):
+        feed = await run_in_threadpool(_render, access_token)
+    headers = {"ETag": f'"{feed["version"]}"', "Cache-Control": "no-store"}
+    if version is not None and feed["version"] == version:
+        return Response(status_code=304, headers=headers)
+    return Response(content=feed["body"], media_type="application/json", headers=headers)
+
+
+@router.post("/overlay/pin")
+def pin_item(payload: PinIn):
+    """Pin an item (by item_id) on the overlay, or clear the pin with null."""
+    access_token = os.getenv("BASE_ACCESS_TOKEN")
+    if not access_token:
+        raise HTTPException(status_code=500, detail="BASE_ACCESS_TOKEN is not set")
+
+    if payload.item_id is None:
+        _PINNED.pop(access_token, None)
+    else:
+        _PINNED[access_token] = payload.item_id
+    return {"pinned": payload.item_id, "version": overlay_changes.bump(access_token)}
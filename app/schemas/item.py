@@ -1,8 +1,40 @@
-from pydantic import BaseModel
-
-class Item(BaseModel):
-    id: int
-    name: str
-    description: str = None
-    price: float
-    is_active: bool = True
+from typing import Optional
+
+from pydantic import ConfigDict, TypeAdapter
+from typing_extensions import TypedDict
+
+
+# BASE /1/items payloads. TypedDicts validate to plain dicts, so normalized data can
+# flow into the caches and snapshots unchanged. Unknown fields are kept (extra="allow").
+
+
+class Variation(TypedDict, total=False):
+    __pydantic_config__ = ConfigDict(extra="allow")
+
+    variation_id: int
+    variation: Optional[str]
+    variation_stock: Optional[int]
+    variation_identifier: Optional[str]
+    barcode: Optional[str]
+
+
+class Item(TypedDict, total=False):
+    __pydantic_config__ = ConfigDict(extra="allow")
+
+    item_id: int
+    title: str
+    detail: Optional[str]
+    price: Optional[int]
+    proper_price: Optional[int]
+    item_tax_type: Optional[int]
+    stock: Optional[int]
+    visible: Optional[int]
+    list_order: Optional[int]
+    identifier: Optional[str]
+    modified: Optional[int]
+    variations: list[Variation]
+
+
+# Validators are compiled once at import (pydantic-core), not per request
+ITEM_ADAPTER = TypeAdapter(Item)
+ITEM_LIST_ADAPTER = TypeAdapter(list[Item])
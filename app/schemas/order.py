@@ -0,0 +1,38 @@
+from typing import Optional
+
+from pydantic import ConfigDict, TypeAdapter
+from typing_extensions import TypedDict
+
+
+# BASE /1/orders and /1/orders/detail payloads (see app/schemas/item.py for the approach).
+
+
+class OrderItem(TypedDict, total=False):
+    __pydantic_config__ = ConfigDict(extra="allow")
+
+    order_item_id: Optional[int]
+    item_id: Optional[int]
+    variation_id: Optional[int]
+    title: Optional[str]
+    price: Optional[int]
+    amount: Optional[int]
+    total: Optional[int]
+    status: Optional[str]
+
+
+class Order(TypedDict, total=False):
+    __pydantic_config__ = ConfigDict(extra="allow")
+
+    unique_key: str
+    ordered: Optional[int]
+    cancelled: Optional[int]
+    dispatched: Optional[int]
+    payment: Optional[str]
+    total: Optional[int]
+    dispatch_status: Optional[str]
+    modified: Optional[int]
+    order_items: list[OrderItem]
+
+
+ORDER_ADAPTER = TypeAdapter(Order)
+ORDER_LIST_ADAPTER = TypeAdapter(list[Order])
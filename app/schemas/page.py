@@ -0,0 +1,61 @@
+from collections.abc import Sequence
+
+from pydantic import TypeAdapter, ValidationError
+
+
+VALIDATION_MODES = ("validated", "lenient", "lazy", "passthrough")
+
+
+class LazyPage(Sequence):
+    """Sequence over raw records that validates each one on first access.
+
+    Useful when a handler only looks at a few records of a page (e.g. the newest
+    orders); untouched records cost nothing.
+    """
+
+    def __init__(self, records: list, adapter: TypeAdapter):
+        self._records = records
+        self._adapter = adapter
+        self._validated: dict[int, dict] = {}
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index not in self._validated:
+            self._validated[index] = self._adapter.validate_python(self._records[index])
+        return self._validated[index]
+
+
+def validate_records(records, adapter: TypeAdapter, list_adapter: TypeAdapter, mode: str = "validated"):
+    """Normalize a list of upstream records according to `mode`.
+
+    - validated: validate every record now
+    - lenient: validate every record now, keeping invalid ones as sent
+    - lazy: return a LazyPage validating records on access
+    - passthrough: return the records untouched
+    Invalid individual records are skipped in `validated` mode rather than failing the page.
+    Use `lenient` when the result must keep one entry per upstream record (e.g. when a
+    missing record would be read as a deletion).
+    """
+    if not isinstance(records, list):
+        return []
+    if mode == "passthrough":
+        return records
+    if mode == "lazy":
+        return LazyPage(records, adapter)
+    try:
+        return list_adapter.validate_python(records)
+    except ValidationError:
+        valid = []
+        for record in records:
+            try:
+                valid.append(adapter.validate_python(record))
+            except ValidationError:
+                if mode == "lenient":
+                    valid.append(record)
+        return valid
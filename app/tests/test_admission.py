@@ -0,0 +1,81 @@
+import asyncio
+from fastapi.testclient import TestClient
+from app.main import app
+from app import admission
+
+
+client = TestClient(app)
+
+
+def test_route_limiter_queues_hands_over_and_sheds():
+    async def scenario():
+        limiter = admission.RouteLimiter(limit=1, queue_limit=1, timeout=1)
+        assert await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.stats()["queued"] == 1
+        assert not await limiter.acquire()  # queue full -> shed
+        limiter.release()
+        assert await waiter
+        assert limiter.stats()["active"] == 1
+        limiter.release()
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats == {"limit": 1, "active": 0, "queued": 0, "admitted": 2, "shed": 1, "shed_stale": 0, "timed_out": 0}
+
+
+def test_route_limiter_queue_deadline():
+    async def scenario():
+        limiter = admission.RouteLimiter(limit=1, queue_limit=5, timeout=0.01)
+        assert await limiter.acquire()
+        assert not await limiter.acquire()
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["timed_out"] == 1 and stats["queued"] == 0
+
+
+def test_saturated_route_serves_stale_or_503(monkeypatch):
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "admission-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+
+    class DummyResp:
+        status_code = 200
+        headers = {"Content-Type": "application/json"}
+
+        def json(self):
+            return {"items": [], "count": 0}
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        return DummyResp()
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+    assert client.get("/items?limit=4").status_code == 200
+
+    # A route with no capacity left sheds every request
+    saturated = admission.RouteLimiter(limit=0, queue_limit=0, timeout=0)
+    monkeypatch.setitem(admission._LIMITERS, "/items", saturated)
+
+    resp = client.get("/api/items?limit=4")
+    assert resp.status_code == 200
+    assert resp.headers["X-Load-Shed"] == "stale"
+    assert resp.headers["X-Degraded"] == "load_shed"
+    assert "Age" in resp.headers
+    assert resp.json()["count"] == 0
+
+    # Entries past the last-good max age are not served
+    from app.routers import items as items_mod
+    monkeypatch.setattr(items_mod, "_LAST_GOOD_MAX_AGE_SECONDS", -1)
+    assert client.get("/items?limit=4").status_code == 503
+    monkeypatch.setattr(items_mod, "_LAST_GOOD_MAX_AGE_SECONDS", 86400)
+
+    resp = client.get("/items?limit=5")
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+
+    # Health and metrics are never queued behind limited routes
+    assert client.get("/healthz").json() == {"ok": True}
+    stats = client.get("/metrics").json()["admission"]["/items"]
+    assert stats["shed"] == 3 and stats["shed_stale"] == 1
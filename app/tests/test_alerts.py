@@ -0,0 +1,128 @@
+import time
+from fastapi.testclient import TestClient
+from app.analytics.alerts import AlertEngine
+from app.main import app
+
+
+client = TestClient(app)
+
+
+def test_alert_engine_fires_only_crossed_rules():
+    engine = AlertEngine(since=0)
+    r1, _ = engine.add_rule("revenue", 5000, label="5k")
+    r2, _ = engine.add_rule("revenue", 10000)
+    r3, _ = engine.add_rule("order_count", 2)
+    r4, _ = engine.add_rule("item_units", 3, item_id=7)
+
+    events = engine.ingest({"unique_key": "a", "total": 6000})
+    assert [(e["rule_id"], e["label"], e["value"]) for e in events] == [(r1["rule_id"], "5k", 6000)]
+
+    # Same order again (e.g. from /orders/detail) adds its items but not its revenue
+    events = engine.ingest({"unique_key": "a", "total": 6000, "order_items": [{"item_id": 7, "amount": 3}]})
+    assert [e["rule_id"] for e in events] == [r4["rule_id"]]
+    assert engine.values["revenue"] == 6000
+
+    # Cancelled orders are ignored
+    assert engine.ingest({"unique_key": "b", "total": 9000, "dispatch_status": "cancelled"}) == []
+
+    events = engine.ingest({"unique_key": "c", "total": 4000})
+    assert {e["rule_id"] for e in events} == {r2["rule_id"], r3["rule_id"]}
+    assert all(rule["fired"] for rule in engine.rules.values())
+
+    # One-shot: further orders fire nothing; a rule already past fires on creation
+    assert engine.ingest({"unique_key": "d", "total": 1}) == []
+    _, events = engine.add_rule("revenue", 100)
+    assert len(events) == 1
+    assert [e["seq"] for e in engine.events_since(3)] == [4, 5]
+
+
+def test_alert_engine_ignores_history_and_subtracts_cancellations():
+    engine = AlertEngine(since=1000)
+    rule, _ = engine.add_rule("revenue", 5000)
+
+    # Paging back through older orders does not count
+    assert engine.ingest({"unique_key": "old", "ordered": 999, "total": 9000}) == []
+    assert engine.values == {}
+
+    engine.ingest({"unique_key": "a", "ordered": 1000, "total": 3000, "order_items": [{"item_id": 7, "amount": 2}]})
+    engine.ingest({"unique_key": "a", "ordered": 1000, "total": 3000, "dispatch_status": "ordered"})
+    assert engine.values == {"revenue": 3000, "order_count": 1, "item_units:7": 2}
+
+    engine.ingest({"unique_key": "a", "ordered": 1000, "total": 3000, "dispatch_status": "cancelled"})
+    assert engine.values == {"revenue": 0, "order_count": 0, "item_units:7": 0}
+
+    # The cancellation lowered revenue, so reaching the threshold takes new sales
+    assert engine.ingest({"unique_key": "b", "ordered": 1001, "total": 4000}) == []
+    events = engine.ingest({"unique_key": "c", "ordered": 1002, "total": 1000})
+    assert [(e["rule_id"], e["value"]) for e in events] == [(rule["rule_id"], 5000)]
+
+
+def test_alert_engine_daily_window_rolls_over(monkeypatch):
+    from types import SimpleNamespace
+    from app.analytics import alerts as alerts_mod
+
+    # 2026-01-01 23:00 JST
+    now = [1767276000.0]
+    monkeypatch.setattr(alerts_mod, "time", SimpleNamespace(time=lambda: now[0]))
+    engine = AlertEngine()
+    assert engine.since == 1767193200  # 2026-01-01 00:00 JST
+    rule, _ = engine.add_rule("order_count", 1)
+    assert engine.ingest({"unique_key": "yesterday", "ordered": engine.since - 1, "total": 1}) == []
+    assert len(engine.ingest({"unique_key": "a", "ordered": now[0], "total": 1})) == 1
+
+    # After midnight the metrics restart and the rule is armed again
+    now[0] += 3600
+    assert engine.window() == 1767279600
+    assert engine.values == {} and not rule["fired"]
+    assert engine.ingest({"unique_key": "a", "ordered": now[0] - 3600, "total": 1}) == []
+    assert [e["rule_id"] for e in engine.ingest({"unique_key": "b", "ordered": now[0], "total": 1})] == [rule["rule_id"]]
+
+
+def test_alert_engine_remove_rule():
+    engine = AlertEngine(since=0)
+    rule, _ = engine.add_rule("order_count", 1)
+    assert engine.remove_rule(rule["rule_id"])
+    assert not engine.remove_rule(rule["rule_id"])
+    assert engine.ingest({"unique_key": "a", "total": 1}) == []
+
+
+def test_alerts_endpoints_fire_from_orders(monkeypatch):
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "alerts-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+
+    class DummyResp:
+        status_code = 200
+        headers = {"Content-Type": "application/json"}
+
+        def json(self):
+            now = int(time.time())
+            return {"orders": [
+                {"unique_key": "x1", "ordered": now, "total": 3000, "dispatch_status": "ordered"},
+                {"unique_key": "x2", "ordered": now, "total": 2500, "dispatch_status": "ordered"},
+                {"unique_key": "x0", "ordered": now - 86400, "total": 9000, "dispatch_status": "ordered"},
+            ]}
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        return DummyResp()
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    assert client.post("/alerts/rules", json={"metric": "visits", "threshold": 1}).status_code == 400
+    assert client.post("/alerts/rules", json={"metric": "item_units", "threshold": 1}).status_code == 400
+    rule = client.post("/alerts/rules", json={"metric": "revenue", "threshold": 5000, "label": "goal"}).json()["rule"]
+    extra = client.post("/api/alerts/rules", json={"metric": "order_count", "threshold": 99}).json()["rule"]
+    assert client.delete(f"/alerts/rules/{extra['rule_id']}").status_code == 200
+    assert client.delete(f"/alerts/rules/{extra['rule_id']}").status_code == 404
+
+    seq = client.get("/alerts/events").json()["seq"]
+    client.get("/orders?limit=2")
+    data = client.get(f"/alerts/events?since={seq}").json()
+    assert [(e["rule_id"], e["label"], e["value"]) for e in data["events"]] == [(rule["rule_id"], "goal", 5500)]
+
+    rules = client.get("/alerts/rules").json()
+    assert rules["values"]["revenue"] == 5500
+    assert [r["fired"] for r in rules["rules"]] == [True]
+
+    feed = client.get("/overlay/feed").json()
+    assert feed["alerts"][-1]["rule_id"] == rule["rule_id"]
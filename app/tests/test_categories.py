@@ -0,0 +1,125 @@
+from fastapi.testclient import TestClient
+from app.main import app
+
+
+client = TestClient(app)
+
+
+class DummyResp:
+    status_code = 200
+    headers = {"Content-Type": "application/json"}
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+CATEGORIES = {
+    "categories": [
+        {"category_id": 10, "name": "メンズ", "list_order": 1, "number": 1, "parent_number": 0},
+        {"category_id": 11, "name": "トップス", "list_order": 1, "number": 2, "parent_number": 1},
+        {"category_id": 12, "name": "Tシャツ", "list_order": 1, "number": 3, "parent_number": 2},
+        {"category_id": 20, "name": "レディース", "list_order": 2, "number": 4, "parent_number": 0},
+    ]
+}
+
+
+def test_categories_tree_is_cached(monkeypatch):
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "cat-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+    calls = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        calls.append(url)
+        assert url == "https://api.base.ec/1/categories"
+        return DummyResp(CATEGORIES)
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    data = client.get("/categories").json()
+    assert [c["category_id"] for c in data["tree"]] == [10, 20]
+    assert data["tree"][0]["children"][0]["children"][0]["category_id"] == 12
+    client.get("/categories")
+    assert len(calls) == 1
+
+
+def test_items_by_category_includes_descendants(monkeypatch):
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "cat-filter-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+    calls = []
+    by_category = {10: [], 11: [{"item_id": 1, "title": "シャツ"}], 12: [{"item_id": 2, "title": "Tシャツ"}], 20: [{"item_id": 3, "title": "スカート"}]}
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        calls.append((url, params.get("category_id")))
+        if url.endswith("/1/categories"):
+            return DummyResp(CATEGORIES)
+        assert url.endswith("/1/items")
+        return DummyResp({"items": by_category[params["category_id"]]})
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    # The index is built actively: each category in the subtree is paged in once
+    data = client.get("/items/by_category?category_id=10").json()
+    assert data["category_ids"] == [10, 11, 12]
+    assert data["item_ids"] == [1, 2]
+    assert [i["title"] for i in data["items"]] == ["シャツ", "Tシャツ"]
+    assert data["complete"] is True
+    assert sorted(cid for _, cid in calls if cid) == [10, 11, 12]
+
+    upstream_calls = len(calls)
+    assert client.get("/items/by_category?category_id=10&descendants=false").json()["item_ids"] == []
+    assert client.get("/items/by_category?category_id=11").json()["item_ids"] == [1, 2]
+    assert len(calls) == upstream_calls
+    assert client.get("/items/by_category?category_id=20").json()["item_ids"] == [3]
+    assert len(calls) == upstream_calls + 1
+
+
+def test_items_by_category_flags_incomplete_sync(monkeypatch):
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "cat-partial-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+
+    class LimitedResp(DummyResp):
+        status_code = 400
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        if url.endswith("/1/categories"):
+            return DummyResp(CATEGORIES)
+        if url.endswith("/1/item_categories/detail/2"):
+            return DummyResp({"item_categories": [{"item_category_id": 1, "item_id": 2, "category_id": 12}]})
+        return LimitedResp({"error": "hour_api_limit"})
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    assert client.get("/item_categories/detail/2").status_code == 200
+    data = client.get("/items/by_category?category_id=10").json()
+    assert data["item_ids"] == [2]
+    assert data["complete"] is False
+
+
+def test_items_by_category_caps_syncs_per_request(monkeypatch):
+    from app.routers import items as items_mod
+
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "cat-capped-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+    monkeypatch.setattr(items_mod, "_CATEGORY_SYNC_MAX_PER_REQUEST", 2)
+    synced = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        if url.endswith("/1/categories"):
+            return DummyResp(CATEGORIES)
+        synced.append(params["category_id"])
+        return DummyResp({"items": [{"item_id": params["category_id"]}]})
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    first = client.get("/items/by_category?category_id=10").json()
+    assert synced == [10, 11] and first["complete"] is False
+    second = client.get("/items/by_category?category_id=10").json()
+    assert synced == [10, 11, 12] and second["complete"] is True
+    assert second["item_ids"] == [10, 11, 12]
@@ -1,4 +1,6 @@
+import json
 import os
+import time
 from fastapi.testclient import TestClient
 from app.main import app
 
@@ -66,3 +68,262 @@ def test_items_with_image_params(monkeypatch):
 
     resp = client.get("/items?limit=5&max_image_no=10&image_size=300,500")
     assert resp.status_code == 200
+
+
+def test_item_changes_tracks_updates_and_deletes(monkeypatch):
+    from app.routers import items as items_mod
+
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "delta-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+    monkeypatch.setattr(items_mod, "_CACHE_TTL_SECONDS", -1)
+
+    pages = [
+        {"items": [{"item_id": 1, "price": 100}, {"item_id": 2, "price": 200}]},
+        {"items": [{"item_id": 1, "price": 150}]},
+    ]
+
+    class DummyResp:
+        status_code = 200
+        headers = {"Content-Type": "application/json"}
+
+        def __init__(self, payload):
+            self.payload = payload
+
+        def json(self):
+            return self.payload
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        return DummyResp(pages.pop(0))
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    assert client.get("/items").status_code == 200
+    first = client.get("/items/changes?since=0").json()
+    assert first["seq"] == 2
+    assert [(c["item_id"], c["op"]) for c in first["changes"]] == [(1, "insert"), (2, "insert")]
+
+    assert client.get("/items").status_code == 200
+    second = client.get(f"/items/changes?since={first['seq']}").json()
+    assert [(c["item_id"], c["op"]) for c in second["changes"]] == [(1, "update"), (2, "delete")]
+    assert second["changes"][0]["item"]["price"] == 150
+
+    assert client.get(f"/items/changes?since={second['seq']}").json()["changes"] == []
+    assert client.get("/items/changes?since=999").status_code == 400
+
+
+def test_item_changes_keep_items_failing_schema(monkeypatch):
+    from app.routers import items as items_mod
+
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "delta-schema-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+    monkeypatch.setattr(items_mod, "_CACHE_TTL_SECONDS", -1)
+
+    first_page = [{"item_id": i, "title": f"item {i}"} for i in range(1, 21)]
+    first_page[4] = {"item_id": 5, "title": None, "variations": None}
+
+    class DummyResp:
+        status_code = 200
+        headers = {"Content-Type": "application/json"}
+
+        def __init__(self, payload):
+            self.payload = payload
+
+        def json(self):
+            return self.payload
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        if params.get("offset") == 20:
+            return DummyResp({"items": [{"item_id": i, "title": f"item {i}"} for i in range(21, 31)]})
+        return DummyResp({"items": first_page})
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    client.get("/items?offset=20")
+    client.get("/items")
+    changes = client.get("/items/changes?since=0").json()["changes"]
+    assert {c["op"] for c in changes} == {"insert"}
+    assert sorted(c["item_id"] for c in changes) == list(range(1, 31))
+    assert next(c for c in changes if c["item_id"] == 5)["item"]["title"] is None
+    # Still served from the item index, not tombstoned
+    assert client.get("/items/detail?item_id=25").json()["item"]["title"] == "item 25"
+
+
+def test_item_changes_ignore_image_size_params(monkeypatch):
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "delta-image-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+
+    class DummyResp:
+        status_code = 200
+        headers = {"Content-Type": "application/json"}
+
+        def __init__(self, payload):
+            self.payload = payload
+
+        def json(self):
+            return self.payload
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        size = params.get("image_size", "origin")
+        return DummyResp({"items": [{"item_id": 1, "price": 100, f"img1_{size}": f"https://img/{size}.jpg"}]})
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    client.get("/items?image_size=origin")
+    seq = client.get("/items/changes?since=0").json()["seq"]
+    client.get("/items?image_size=76")
+    client.get("/items?image_size=origin&max_image_no=1")
+    changes = client.get("/items/changes?since=0").json()
+    assert changes["seq"] == seq
+    assert changes["changes"][0]["item"]["img1_76"] == "https://img/76.jpg"
+
+
+def test_items_serves_stale_cache_while_circuit_open(monkeypatch):
+    from app.api_client import resilience
+    from app.routers import items as items_mod
+
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "circuit-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setattr(resilience, "_BREAKER_FAILURE_THRESHOLD", 1)
+
+    class DummyResp:
+        headers = {"Content-Type": "application/json"}
+
+        def __init__(self, status_code):
+            self.status_code = status_code
+            self.text = ""
+
+        def json(self):
+            return {"items": [{"item_id": 9}]} if self.status_code == 200 else {"error": "db_error"}
+
+    statuses = [200, 500]
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        return DummyResp(statuses.pop(0))
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    assert client.get("/items?limit=7").status_code == 200
+    monkeypatch.setattr(items_mod, "_CACHE_TTL_SECONDS", -1)
+    assert client.get("/items?limit=7").status_code == 500  # opens the breaker
+
+    resp = client.get("/items?limit=7")
+    assert resp.status_code == 200
+    assert resp.headers["X-Upstream-Circuit"] == "open"
+    assert resp.json()["items"][0]["item_id"] == 9
+
+    assert client.get("/items?limit=8").status_code == 503
+    assert client.get("/health").json()["upstream"]["/1/items"]["state"] == "open"
+
+
+def test_items_serves_last_good_during_rate_limit(monkeypatch):
+    from app.routers import items as items_mod
+
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "lockout-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+    monkeypatch.setattr(items_mod, "_RATE_LIMIT_BACKOFF", {})
+
+    class DummyResp:
+        headers = {"Content-Type": "application/json"}
+        text = ""
+
+        def __init__(self, status_code, payload):
+            self.status_code = status_code
+            self.payload = payload
+
+        def json(self):
+            return self.payload
+
+    responses = [DummyResp(200, {"items": [{"item_id": 4}]}), DummyResp(400, {"error": "hour_api_limit"})]
+    calls = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        calls.append(params)
+        return responses.pop(0)
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    assert client.get("/items?limit=9").status_code == 200
+    monkeypatch.setattr(items_mod, "_CACHE_TTL_SECONDS", -1)
+
+    # Upstream answers with the hourly limit: last good page is served instead of 429
+    resp = client.get("/items?limit=9")
+    assert resp.status_code == 200
+    assert resp.headers["X-Degraded"] == "rate_limited"
+    assert int(resp.headers["Age"]) >= 0 and "Retry-After" in resp.headers
+    assert resp.json()["items"] == [{"item_id": 4}]
+
+    # During the backoff window upstream is not called at all
+    resp = client.get("/items?limit=9")
+    assert resp.status_code == 200 and resp.headers["X-Degraded"] == "rate_limited"
+    assert len(calls) == 2
+
+    # No last good copy for this key -> 429 as before
+    assert client.get("/items?limit=10").status_code == 429
+
+
+def test_item_detail_served_from_cached_list(monkeypatch):
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "detail-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+
+    class DummyResp:
+        status_code = 200
+        headers = {"Content-Type": "application/json"}
+
+        def __init__(self, payload):
+            self.payload = payload
+
+        def json(self):
+            return self.payload
+
+    calls = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        calls.append(url)
+        if url.endswith("/1/items"):
+            return DummyResp({"items": [{"item_id": 11, "title": "A", "stock": 2}, {"item_id": 12, "title": "B", "stock": 0}]})
+        assert url == "https://api.base.ec/1/items/detail/13"
+        return DummyResp({"item": {"item_id": 13, "title": "C", "stock": 9}})
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    client.get("/items?limit=2&offset=40")
+    calls.clear()
+
+    # Clicking an item from the list makes no upstream call
+    resp = client.get("/items/detail?item_id=12")
+    assert resp.status_code == 200
+    assert resp.json() == {"item": {"item_id": 12, "title": "B", "stock": 0}}
+    assert calls == []
+
+    # Unknown items fall through to /1/items/detail once, then come from the index
+    assert client.get("/items/detail?item_id=13").json()["item"]["title"] == "C"
+    assert client.get("/api/items/detail?item_id=13").json()["item"]["title"] == "C"
+    assert calls == ["https://api.base.ec/1/items/detail/13"]
+
+    # Stale copies are refreshed from upstream
+    from app.routers import items as items_mod
+    monkeypatch.setattr(items_mod, "_DETAIL_MAX_AGE_SECONDS", -1)
+    client.get("/items/detail?item_id=13")
+    assert len(calls) == 2
+
+    # ...unless upstream is rate-limited: then the indexed copy is served as degraded
+    monkeypatch.setitem(items_mod._RATE_LIMIT_BACKOFF, "detail-token", time.time() + 30)
+    resp = client.get("/items/detail?item_id=11")
+    assert resp.status_code == 200
+    assert resp.headers["X-Degraded"] == "rate_limited"
+    assert resp.json()["item"]["title"] == "A"
+    assert len(calls) == 2
+
+    # Index hits reuse the encoded body; the route is under admission control with the
+    # indexed copy as its load-shedding fallback
+    assert items_mod._ITEM_INDEX["detail-token"][12]["body"] == client.get("/items/detail?item_id=12").content
+    from app.admission import admission_stats
+    assert "/items/detail" in admission_stats()
+    assert json.loads(items_mod._stale_item_detail({"item_id": "12"})["body"])["item"]["title"] == "B"
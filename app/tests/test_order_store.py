@@ -0,0 +1,74 @@
+import threading
+from app.analytics.order_store import OrderStore
+
+
+def test_group_by_hour_item_status():
+    store = OrderStore()
+    store.add_order({"unique_key": "a", "ordered": 3600 * 10 + 5, "total": 1000, "dispatch_status": "ordered"})
+    store.add_order({"unique_key": "b", "ordered": 3600 * 10 + 50, "total": 500, "dispatch_status": "dispatched"})
+    store.add_order({"unique_key": "c", "ordered": 3600 * 11, "total": 200, "dispatch_status": "ordered"})
+    # Duplicate summary is ignored
+    store.add_order({"unique_key": "a", "ordered": 3600 * 10 + 5, "total": 1000, "dispatch_status": "ordered"})
+
+    assert store.group_by("hour") == {36000: (1500, 2), 39600: (200, 1)}
+    assert store.group_by("status") == {"ordered": (1200, 2), "dispatched": (500, 1)}
+    assert store.group_by("hour", since=3600 * 11) == {39600: (200, 1)}
+    # Unaligned range falls back to a column scan
+    assert store.group_by("status", since=3600 * 10 + 10) == {"ordered": (200, 1), "dispatched": (500, 1)}
+
+
+def test_detail_supersedes_summary_row():
+    store = OrderStore()
+    store.add_order({"unique_key": "a", "ordered": 100, "total": 1000, "dispatch_status": "ordered"})
+    store.add_order({
+        "unique_key": "a",
+        "ordered": 100,
+        "dispatch_status": "ordered",
+        "order_items": [
+            {"item_id": 1, "price": 300, "amount": 2},
+            {"item_id": 2, "total": 400, "status": "cancelled"},
+        ],
+    })
+
+    assert store.group_by("item") == {1: (600, 1), 2: (400, 1)}
+    assert store.group_by("status") == {"ordered": (600, 1), "cancelled": (400, 1)}
+    assert store.nbytes() == len(store) * 25
+
+
+def test_later_payloads_update_status_and_totals():
+    store = OrderStore()
+    store.add_order({"unique_key": "a", "ordered": 100, "total": 1000, "dispatch_status": "ordered"})
+    assert store.add_order({"unique_key": "a", "ordered": 100, "total": 1200, "dispatch_status": "cancelled"})
+    assert store.group_by("status") == {"cancelled": (1200, 1)}
+    assert not store.add_order({"unique_key": "a", "ordered": 100, "total": 1200, "dispatch_status": "cancelled"})
+
+    store.add_order({
+        "unique_key": "b",
+        "ordered": 100,
+        "dispatch_status": "ordered",
+        "order_items": [{"item_id": 1, "total": 600}, {"item_id": 2, "total": 400, "status": "cancelled"}],
+    })
+    store.add_order({"unique_key": "b", "ordered": 100, "total": 600, "dispatch_status": "dispatched"})
+    assert store.group_by("status") == {"cancelled": (1600, 2), "dispatched": (600, 1)}
+    store.add_order({"unique_key": "b", "ordered": 100, "total": 600, "dispatch_status": "cancelled"})
+    assert store.group_by("status") == {"cancelled": (2200, 3)}
+    assert store.group_by("item") == {0: (1200, 1), 1: (600, 1), 2: (400, 1)}
+    assert len(store) == 3
+
+
+def test_concurrent_add_order_keeps_one_row_per_order():
+    store = OrderStore()
+    page = [{"unique_key": f"k{i}", "ordered": 3600 + i, "total": 100, "dispatch_status": "ordered"} for i in range(500)]
+
+    def record():
+        for order in page:
+            store.add_order(order)
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(store) == 500
+    assert store.group_by("status") == {"ordered": (50000, 500)}
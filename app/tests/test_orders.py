@@ -60,3 +60,201 @@ def test_order_detail_ok(monkeypatch):
     resp = client.get("/orders/detail?order_id=123")
     assert resp.status_code == 200
     assert resp.json()["order"]["order_id"] == 123
+
+
+def test_orders_aggregate_from_fetched_orders(monkeypatch):
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "aggregate-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+
+    class DummyResp:
+        status_code = 200
+        headers = {"Content-Type": "application/json"}
+
+        def json(self):
+            return {"orders": [
+                {"unique_key": "k1", "ordered": 7200, "total": 3000, "dispatch_status": "ordered"},
+                {"unique_key": "k2", "ordered": 7300, "total": 1000, "dispatch_status": "dispatched"},
+            ]}
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        return DummyResp()
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    assert client.get("/orders?limit=2&offset=0").status_code == 200
+    resp = client.get("/orders/aggregate?by=status")
+    assert resp.status_code == 200
+    assert resp.json()["groups"] == [
+        {"key": "ordered", "total": 3000, "count": 1},
+        {"key": "dispatched", "total": 1000, "count": 1},
+    ]
+    assert client.get("/orders/aggregate?by=day").status_code == 400
+
+
+def test_orders_export_ndjson_pages_and_pauses(monkeypatch):
+    import json
+    import time
+    from app.routers import orders as orders_mod
+
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "export-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+    monkeypatch.setattr(orders_mod, "_EXPORT_PAGE_SIZE", 2)
+    monkeypatch.setattr(orders_mod, "_EXPORT_MAX_WAIT_SECONDS", 86400)
+
+    pages = {
+        0: [{"unique_key": "a", "total": 1}, {"unique_key": "b", "total": 2}],
+        2: [{"unique_key": "c", "total": 3}],
+    }
+    calls = []
+
+    class DummyResp:
+        headers = {"Content-Type": "application/json"}
+
+        def __init__(self, status_code, payload):
+            self.status_code = status_code
+            self.payload = payload
+
+        def json(self):
+            return self.payload
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        calls.append(params["offset"])
+        if len(calls) == 2:
+            # Second page hits the hourly limit once; export must wait instead of failing
+            return DummyResp(400, {"error": "hour_api_limit"})
+        return DummyResp(200, {"orders": pages[params["offset"]]})
+
+    slept = []
+
+    def fake_sleep(secs):
+        slept.append(secs)
+        orders_mod._RATE_LIMIT_BACKOFF.pop("export-token", None)
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+    monkeypatch.setattr(time, "sleep", fake_sleep)
+
+    resp = client.get("/orders/export?format=ndjson")
+    assert resp.status_code == 200
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r["unique_key"] for r in rows] == ["a", "b", "c"]
+    assert calls == [0, 2, 2]
+    assert len(slept) == 1
+
+
+def test_orders_export_csv_with_details(monkeypatch):
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "export-csv-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+
+    class DummyResp:
+        status_code = 200
+        headers = {"Content-Type": "application/json"}
+
+        def __init__(self, payload):
+            self.payload = payload
+
+        def json(self):
+            return self.payload
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        if url.endswith("/1/orders/detail"):
+            return DummyResp({"order": {"order_items": [{"item_id": 7, "amount": 2, "total": 600}]}})
+        return DummyResp({"orders": [{"unique_key": "k1", "total": 600}]})
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    resp = client.get("/orders/export?format=csv&details=true")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/csv")
+    lines = resp.text.strip().splitlines()
+    assert lines[0].startswith("unique_key,ordered") and lines[0].endswith("item_total")
+    assert lines[1].startswith("k1,") and lines[1].endswith(",7,,,,2,600")
+    assert len(lines) == 2
+
+
+def test_orders_export_csv_failure_is_not_a_clean_file():
+    import pytest
+    from fastapi import HTTPException
+    from app.routers.orders import _csv_lines
+
+    def rows():
+        yield {"unique_key": "k1", "total": 600}
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    chunks = []
+    with pytest.raises(HTTPException):
+        for chunk in _csv_lines(rows(), ["unique_key", "total"]):
+            chunks.append(chunk)
+    lines = "".join(chunks).splitlines()
+    assert lines[:2] == ["unique_key,total", "k1,600"]
+    assert lines[2].startswith("#export_aborted status=404")
+
+
+def test_orders_serves_last_good_during_backoff(monkeypatch):
+    import time
+    from app.routers import orders as orders_mod
+
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "orders-lockout-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+
+    class DummyResp:
+        status_code = 200
+        headers = {"Content-Type": "application/json"}
+
+        def json(self):
+            return {"orders": [], "count": 3}
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        return DummyResp()
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    assert client.get("/orders?limit=3").status_code == 200
+    monkeypatch.setattr(orders_mod, "_CACHE_TTL_SECONDS", -1)
+    monkeypatch.setitem(orders_mod._RATE_LIMIT_BACKOFF, "orders-lockout-token", time.time() + 3600)
+
+    resp = client.get("/orders?limit=3")
+    assert resp.status_code == 200
+    assert resp.headers["X-Degraded"] == "rate_limited"
+    assert resp.json()["count"] == 3
+
+    monkeypatch.setattr(orders_mod, "_LAST_GOOD_MAX_AGE_SECONDS", -1)
+    assert client.get("/orders?limit=3").status_code == 429
+
+
+def test_orders_upstream_503_is_not_reported_as_open_circuit(monkeypatch):
+    from app.api_client import resilience
+    from app.routers import orders as orders_mod
+
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "orders-503-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+
+    class DummyResp:
+        headers = {"Content-Type": "application/json"}
+        text = ""
+
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+        def json(self):
+            return {"orders": [], "count": 1} if self.status_code == 200 else {"error": "maintenance"}
+
+    statuses = [200, 503]
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        return DummyResp(statuses.pop(0))
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    assert client.get("/orders?limit=4").status_code == 200
+    monkeypatch.setattr(orders_mod, "_CACHE_TTL_SECONDS", -1)
+    resp = client.get("/orders?limit=4")
+    assert resp.status_code == 200
+    assert resp.headers["X-Degraded"] == "upstream_unavailable"
+    assert "X-Upstream-Circuit" not in resp.headers
+    assert resilience.breaker_states()["/1/orders"]["state"] == "closed"
@@ -0,0 +1,96 @@
+import threading
+import time
+from fastapi.testclient import TestClient
+from app.main import app
+
+
+client = TestClient(app)
+
+
+class DummyResp:
+    status_code = 200
+    headers = {"Content-Type": "application/json"}
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+def test_overlay_feed_payload_and_versions(monkeypatch):
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "overlay-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        if url.endswith("/1/items"):
+            return DummyResp({"items": [{"item_id": 5, "title": "Tシャツ", "price": 3900, "stock": 3, "detail": "long text"}]})
+        return DummyResp({"orders": [
+            {"unique_key": "o1", "ordered": 100, "total": 3900, "dispatch_status": "ordered"},
+            {"unique_key": "o2", "ordered": 200, "total": 1000, "dispatch_status": "cancelled"},
+        ]})
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    client.get("/items?limit=1")
+    client.get("/orders?limit=2")
+    client.post("/overlay/pin", json={"item_id": 5})
+
+    resp = client.get("/overlay/feed")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert [o["unique_key"] for o in data["orders"]] == ["o2", "o1"]
+    assert data["totals"] == {"amount": 3900, "count": 1}
+    assert data["pinned"] == {"item_id": 5, "title": "Tシャツ", "price": 3900, "stock": 3, "img1_origin": None}
+
+    # Payload is rendered once per change, not once per poll
+    from app.routers import overlay as overlay_mod
+    builds = []
+    real_build = overlay_mod._build_payload
+    monkeypatch.setattr(overlay_mod, "_build_payload", lambda *a: builds.append(a) or real_build(*a))
+    for _ in range(3):
+        assert client.get("/overlay/feed").json()["version"] == data["version"]
+    assert builds == []
+
+    # Unchanged data: long-poll times out with 304
+    resp = client.get(f"/overlay/feed?version={data['version']}&timeout=0.05")
+    assert resp.status_code == 304
+
+
+def test_overlay_feed_long_poll_wakes_on_change(monkeypatch):
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "overlay-poll-token")
+    version = client.get("/overlay/feed").json()["version"]
+
+    def pin_later():
+        time.sleep(0.1)
+        client.post("/overlay/pin", json={"item_id": 9})
+
+    threading.Thread(target=pin_later).start()
+    start = time.monotonic()
+    resp = client.get(f"/overlay/feed?version={version}&timeout=5")
+    assert resp.status_code == 200
+    assert time.monotonic() - start < 5
+    assert resp.json()["version"] == version + 1
+    assert resp.json()["pinned"] == {"item_id": 9}
+
+
+def test_overlay_rebuild_runs_off_the_event_loop(monkeypatch):
+    import asyncio
+    import pytest
+    from app.routers import overlay as overlay_mod
+
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "overlay-thread-token")
+    loops = []
+    real_build = overlay_mod._build_payload
+
+    def build(*args):
+        # Raises when called on the event loop thread (no running loop in a worker thread)
+        with pytest.raises(RuntimeError):
+            asyncio.get_running_loop()
+        loops.append(args)
+        return real_build(*args)
+
+    monkeypatch.setattr(overlay_mod, "_build_payload", build)
+    assert client.get("/overlay/feed").status_code == 200
+    assert len(loops) == 1
@@ -0,0 +1,126 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app import prefetch
+
+
+client = TestClient(app)
+
+
+class DummyResp:
+    status_code = 200
+    headers = {"Content-Type": "application/json"}
+
+    def __init__(self, offset):
+        self.offset = offset
+
+    def json(self):
+        return {"items": [{"item_id": self.offset + 1}, {"item_id": self.offset + 2}]}
+
+
+def _drain():
+    # Single worker: a no-op queued behind pending prefetches completes after them
+    prefetch._EXECUTOR.submit(lambda: None).result(timeout=5)
+
+
+def test_sequential_paging_prefetches_next_page(monkeypatch):
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "prefetch-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+    monkeypatch.setattr(prefetch, "_STATS", dict.fromkeys(prefetch._STATS, 0))
+    offsets = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        offsets.append(params["offset"])
+        return DummyResp(params["offset"])
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    assert client.get("/items?limit=2&offset=0").status_code == 200
+    assert client.get("/items?limit=2&offset=2").status_code == 200
+    _drain()
+    assert offsets == [0, 2, 4]
+
+    # Next click is served from the prefetched page, and page N+1 is warmed again
+    resp = client.get("/items?limit=2&offset=4")
+    assert resp.json()["items"][0]["item_id"] == 5
+    _drain()
+    assert offsets == [0, 2, 4, 6]
+
+    stats = client.get("/metrics").json()["prefetch"]
+    assert stats["issued"] == 2 and stats["hits"] == 1 and stats["hit_rate"] == 0.5
+
+
+def test_prefetch_stops_when_quota_is_tight(monkeypatch):
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "prefetch-quota-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+    monkeypatch.setattr(prefetch, "_STATS", dict.fromkeys(prefetch._STATS, 0))
+    monkeypatch.setattr(prefetch, "_HOURLY_API_LIMIT", 2)
+    offsets = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        offsets.append(params["offset"])
+        return DummyResp(params["offset"])
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    client.get("/orders?limit=2&offset=0")
+    client.get("/orders?limit=2&offset=2")
+    _drain()
+    assert offsets == [0, 2]
+    assert prefetch.prefetch_stats()["skipped_quota"] == 1
+
+
+def test_short_page_is_not_prefetched_past(monkeypatch):
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "prefetch-short-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+    monkeypatch.setattr(prefetch, "_STATS", dict.fromkeys(prefetch._STATS, 0))
+    offsets = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        offsets.append(params["offset"])
+        return DummyResp(params["offset"])  # two items per page
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    client.get("/items?limit=3&offset=0")
+    client.get("/items?limit=3&offset=3")
+    _drain()
+    assert offsets == [0, 3]
+    assert prefetch.prefetch_stats()["issued"] == 0
+
+
+def test_prefetched_keys_are_bounded(monkeypatch):
+    monkeypatch.setattr(prefetch, "_PREFETCHED", prefetch.OrderedDict())
+    monkeypatch.setattr(prefetch, "_MAX_PREFETCHED", 2)
+    for key in ("a", "b", "c"):
+        prefetch._run(key, lambda p: None, {})
+    assert list(prefetch._PREFETCHED) == ["b", "c"]
+
+
+def test_breaker_rejected_calls_use_no_quota(monkeypatch):
+    from app.api_client import resilience
+
+    monkeypatch.setenv("BASE_ACCESS_TOKEN", "prefetch-breaker-token")
+    monkeypatch.setenv("BASE_API_URL", "https://api.base.ec")
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setattr(resilience, "_BREAKER_FAILURE_THRESHOLD", 1)
+
+    class FailingResp:
+        status_code = 500
+        headers = {"Content-Type": "application/json"}
+        text = ""
+
+        def json(self):
+            return {"error": "db_error"}
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        return FailingResp()
+
+    import requests
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    assert client.get("/orders?limit=9").status_code == 500  # opens the breaker
+    assert client.get("/orders?limit=9").status_code == 503
+    assert prefetch._UPSTREAM_CALLS["prefetch-breaker-token"][1] == 1
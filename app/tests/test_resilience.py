@@ -0,0 +1,85 @@
+import time
+
+import pytest
+import requests
+
+from app.api_client import resilience
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setattr(resilience, "_LATENCIES", {})
+    monkeypatch.setattr(time, "sleep", lambda secs: None)
+
+
+class DummyResp:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+
+def test_retries_connect_errors_then_succeeds(monkeypatch):
+    calls = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        calls.append(timeout)
+        if len(calls) < 3:
+            raise requests.ConnectionError("refused")
+        return DummyResp()
+
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    resp = resilience.resilient_get("/1/items", "https://api.base.ec/1/items", {}, {})
+    assert resp.status_code == 200
+    assert len(calls) == 3
+    assert resilience.breaker_states()["/1/items"]["state"] == "closed"
+
+
+def test_read_timeout_is_not_retried(monkeypatch):
+    calls = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        calls.append(url)
+        raise requests.ReadTimeout("slow")
+
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    with pytest.raises(requests.ReadTimeout):
+        resilience.resilient_get("/1/items", "https://api.base.ec/1/items", {}, {})
+    assert len(calls) == 1
+
+
+def test_breaker_opens_fails_fast_and_recovers(monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKER_FAILURE_THRESHOLD", 2)
+    statuses = [502, 503, 200]
+    calls = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        calls.append(url)
+        return DummyResp(statuses.pop(0))
+
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    for _ in range(2):
+        resilience.resilient_get("/1/orders", "https://api.base.ec/1/orders", {}, {})
+    assert resilience.breaker_states()["/1/orders"]["state"] == "open"
+
+    with pytest.raises(resilience.CircuitOpenError):
+        resilience.resilient_get("/1/orders", "https://api.base.ec/1/orders", {}, {})
+    assert len(calls) == 2
+
+    # After the cool-down a single probe is let through and closes the breaker
+    resilience._BREAKERS["/1/orders"].opened_at -= resilience._BREAKER_RESET_SECONDS
+    assert resilience.resilient_get("/1/orders", "https://api.base.ec/1/orders", {}, {}).status_code == 200
+    assert resilience.breaker_states()["/1/orders"]["state"] == "closed"
+
+
+def test_timeout_adapts_to_observed_latency():
+    tracker = resilience.LatencyTracker()
+    assert tracker.timeout() == resilience._MAX_TIMEOUT_SECONDS
+    for _ in range(50):
+        tracker.observe(0.1)
+    assert tracker.timeout() == resilience._MIN_TIMEOUT_SECONDS
+    for _ in range(50):
+        tracker.observe(1.0)
+    assert tracker.timeout() == pytest.approx(3.0)
@@ -0,0 +1,40 @@
+from app.schemas.item import ITEM_ADAPTER, ITEM_LIST_ADAPTER
+from app.schemas.order import ORDER_ADAPTER, ORDER_LIST_ADAPTER
+from app.schemas.page import LazyPage, validate_records
+
+
+def test_validated_mode_normalizes_and_keeps_extra_fields():
+    items = validate_records(
+        [{"item_id": "5", "title": "Tシャツ", "price": "3900", "img1_origin": "https://example.com/1.jpg"}],
+        ITEM_ADAPTER,
+        ITEM_LIST_ADAPTER,
+    )
+    assert items == [{"item_id": 5, "title": "Tシャツ", "price": 3900, "img1_origin": "https://example.com/1.jpg"}]
+
+
+def test_validated_mode_skips_invalid_records():
+    orders = validate_records(
+        [{"unique_key": "a", "total": "100"}, {"unique_key": "b", "total": "not a number"}, None],
+        ORDER_ADAPTER,
+        ORDER_LIST_ADAPTER,
+    )
+    assert orders == [{"unique_key": "a", "total": 100}]
+
+
+def test_lenient_mode_keeps_invalid_records_as_sent():
+    records = [{"item_id": "1", "title": "A"}, {"item_id": 2, "title": None, "variations": None}]
+    assert validate_records(records, ITEM_ADAPTER, ITEM_LIST_ADAPTER, mode="lenient") == [
+        {"item_id": 1, "title": "A"},
+        {"item_id": 2, "title": None, "variations": None},
+    ]
+
+
+def test_lazy_and_passthrough_modes():
+    records = [{"item_id": str(i)} for i in range(3)]
+
+    lazy = validate_records(records, ITEM_ADAPTER, ITEM_LIST_ADAPTER, mode="lazy")
+    assert isinstance(lazy, LazyPage) and len(lazy) == 3
+    assert lazy[-1] == {"item_id": 2}
+    assert lazy._validated.keys() == {2}
+
+    assert validate_records(records, ITEM_ADAPTER, ITEM_LIST_ADAPTER, mode="passthrough") is records
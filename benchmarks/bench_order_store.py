@@ -0,0 +1,87 @@
+"""Compare memory and group-by speed of OrderStore against plain order dicts.
+
+Usage:
+    python -m benchmarks.bench_order_store [N]   (default N=1000000)
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+from app.analytics.order_store import OrderStore
+
+STATUSES = ["ordered", "unpaid", "dispatched", "cancelled"]
+
+
+def _orders(n: int):
+    rnd = random.Random(42)
+    base = 1_700_000_000
+    for i in range(n):
+        yield {
+            "unique_key": f"{i:032x}",
+            "ordered": base + rnd.randrange(0, 14 * 86400),
+            "total": rnd.randrange(500, 20000),
+            "dispatch_status": rnd.choice(STATUSES),
+            "order_items": [{"item_id": rnd.randrange(1, 500), "total": rnd.randrange(500, 20000)}],
+        }
+
+
+def _dict_group_by_hour(orders):
+    totals = {}
+    for o in orders:
+        k = o["ordered"] - o["ordered"] % 3600
+        totals[k] = totals.get(k, 0) + o["total"]
+    return totals
+
+
+def _dict_group_by_item(orders):
+    totals = {}
+    for o in orders:
+        for line in o["order_items"]:
+            totals[line["item_id"]] = totals.get(line["item_id"], 0) + line["total"]
+    return totals
+
+
+def _measure(build):
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(n: int):
+    orders, dict_bytes = _measure(lambda: list(_orders(n)))
+
+    def build_store():
+        # The real ingest path: add_order also keeps the unique_key -> row index
+        store = OrderStore()
+        for o in _orders(n):
+            store.add_order(o)
+        return store
+
+    store, store_bytes = _measure(build_store)
+
+    print(f"orders: {n:,}")
+    print(f"memory  dicts: {dict_bytes / 1e6:8.1f} MB   store: {store_bytes / 1e6:8.1f} MB   ({dict_bytes / max(store_bytes, 1):.1f}x)")
+    print(f"        of which columns: {store.nbytes() / 1e6:.1f} MB, unique_key index: {(store_bytes - store.nbytes()) / 1e6:.1f} MB")
+    for by, dict_fn in (("hour", _dict_group_by_hour), ("item", _dict_group_by_item)):
+        t_dict = _timed(lambda: dict_fn(orders))
+        t_store = _timed(lambda: store.group_by(by))
+        print(f"group_by {by:<6} dicts: {t_dict * 1e3:8.1f} ms   store: {t_store * 1e3:8.1f} ms   ({t_dict / t_store:.1f}x)")
+
+    # Arbitrary (non hour-aligned) range: rollups cannot answer, the store scans its columns
+    since = 1_700_000_000 + 7 * 86400 + 1
+    t_dict = _timed(lambda: _dict_group_by_item([o for o in orders if o["ordered"] >= since]))
+    t_store = _timed(lambda: store.group_by("item", since=since))
+    print(f"range scan     dicts: {t_dict * 1e3:8.1f} ms   store: {t_store * 1e3:8.1f} ms   ({t_dict / t_store:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
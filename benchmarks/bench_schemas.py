@@ -0,0 +1,65 @@
+"""Compare validation modes for a 100-item /1/items page.
+
+Usage:
+    python -m benchmarks.bench_schemas [ROUNDS]   (default ROUNDS=2000)
+"""
+import json
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from app.schemas.item import ITEM_ADAPTER, ITEM_LIST_ADAPTER
+from app.schemas.page import validate_records
+
+
+def _page(n: int = 100) -> bytes:
+    items = []
+    for i in range(n):
+        items.append({
+            "item_id": 1000 + i,
+            "title": f"商品 {i}",
+            "detail": "とってもオシャレなTシャツです。" * 5,
+            "price": 3900,
+            "proper_price": None,
+            "item_tax_type": 1,
+            "stock": 10,
+            "visible": 1,
+            "list_order": i,
+            "identifier": f"abcd-{i}",
+            "img1_origin": "https://example.com/1.jpg",
+            "img2_origin": None,
+            "modified": 1414731171,
+            "variations": [
+                {"variation_id": 11, "variation": "黒色", "variation_stock": 6, "variation_identifier": "b", "barcode": "b"},
+                {"variation_id": 12, "variation": "白色", "variation_stock": 4, "variation_identifier": "w", "barcode": "w"},
+            ],
+        })
+    return json.dumps({"items": items}, ensure_ascii=False).encode()
+
+
+def _bench(label: str, fn, rounds: int):
+    fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    per_call = (time.perf_counter() - start) / rounds
+    print(f"{label:<40} {per_call * 1e6:9.1f} us/page")
+
+
+def main(rounds: int):
+    raw = _page()
+    parsed = json.loads(raw)
+    items_raw = json.dumps(parsed["items"], ensure_ascii=False).encode()
+
+    print(f"page: 100 items, {len(raw):,} bytes, {rounds:,} rounds")
+    _bench("passthrough (cached bytes)", lambda: raw, rounds)
+    _bench("dict re-encode (FastAPI default)", lambda: json.dumps(jsonable_encoder(parsed)).encode(), rounds)
+    _bench("parse only (json.loads)", lambda: json.loads(raw), rounds)
+    _bench("lazy (parse + validate 5 items)", lambda: validate_records(json.loads(raw)["items"], ITEM_ADAPTER, ITEM_LIST_ADAPTER, "lazy")[:5], rounds)
+    _bench("validated (parse + validate page)", lambda: validate_records(json.loads(raw)["items"], ITEM_ADAPTER, ITEM_LIST_ADAPTER), rounds)
+    _bench("validated from bytes (validate_json)", lambda: ITEM_LIST_ADAPTER.validate_json(items_raw), rounds)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)